@@ -5,3 +5,6 @@ from django.apps import AppConfig
 
 class AccountConfig(AppConfig):
     name = "accounts"
+
+    def ready(self):
+        from . import signals  # noqa: F401
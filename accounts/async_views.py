@@ -0,0 +1,22 @@
+# accounts/async_views.py
+
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+from config.async_views import async_api_view, json_response
+
+from . import views
+from .authentication import aget_full_user
+
+
+@ensure_csrf_cookie
+@async_api_view(views.me_view)
+async def me_view(request):
+    user = await aget_full_user(request)
+    return json_response(
+        {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "role": user.role,
+        }
+    )
@@ -1,8 +1,32 @@
 # accounts/authentication.py
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
 from rest_framework.exceptions import AuthenticationFailed
 
+from config import metrics
+from config.timing import span
+
+from .tokens import VERSION_CLAIM, acurrent_token_version, current_token_version
+
+User = get_user_model()
+
+
+class ClaimsUser(TokenUser):
+    """
+    User built from the claims signed into the access token. Carries id,
+    username and role; views that need anything else use get_full_user().
+    """
+
+    @cached_property
+    def role(self):
+        return self.token["role"]
+
 
 class JWTCookieAuthentication(JWTAuthentication):
     """
@@ -10,6 +34,10 @@ class JWTCookieAuthentication(JWTAuthentication):
     """
 
     def authenticate(self, request):
+        with span("auth"):
+            return self._authenticate(request)
+
+    def _authenticate(self, request):
         # Prvo pokušaj iz cookies
         raw_token = request.COOKIES.get("access_token")
 
@@ -22,3 +50,96 @@ class JWTCookieAuthentication(JWTAuthentication):
             return self.get_user(validated_token), validated_token
         except Exception:
             raise AuthenticationFailed("Invalid or expired token")
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views. Only the cache and database reads
+        are awaited; with claim-based users that is the token version alone.
+        """
+        with span("auth"):
+            raw_token = request.COOKIES.get("access_token")
+            if raw_token is None:
+                header = self.get_header(request)
+                if header is None:
+                    return None
+                raw_token = self.get_raw_token(header)
+                if raw_token is None:
+                    return None
+                validated_token = self.get_validated_token(raw_token)
+                return await self.aget_user(validated_token), validated_token
+
+            try:
+                validated_token = self.get_validated_token(raw_token)
+                return await self.aget_user(validated_token), validated_token
+            except Exception:
+                raise AuthenticationFailed("Invalid or expired token")
+
+    def get_user(self, validated_token):
+        # Tokens issued before the role/version claims existed still go
+        # through the database lookup.
+        if settings.JWT_STATELESS_USER and "role" in validated_token:
+            user = ClaimsUser(validated_token)
+            version = current_token_version(user.id)
+        else:
+            user = super().get_user(validated_token)
+            version = user.token_version
+        self.check_version(validated_token, version)
+        return user
+
+    async def aget_user(self, validated_token):
+        if settings.JWT_STATELESS_USER and "role" in validated_token:
+            user = ClaimsUser(validated_token)
+            version = await acurrent_token_version(user.id)
+        else:
+            user = await sync_to_async(super().get_user)(validated_token)
+            version = user.token_version
+        self.check_version(validated_token, version)
+        return user
+
+    @staticmethod
+    def check_version(validated_token, version):
+        if (
+            VERSION_CLAIM in validated_token
+            and validated_token[VERSION_CLAIM] != version
+        ):
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
+def get_full_user(request):
+    """
+    The CustomUser row for request.user, cached per access token for
+    JWT_USER_CACHE_TIMEOUT seconds.
+    """
+    user = request.user
+    if isinstance(user, User):
+        return user
+
+    timeout = settings.JWT_USER_CACHE_TIMEOUT
+    if not timeout:
+        return User.objects.get(pk=user.id)
+
+    key = f"auth:token:{request.auth['jti']}:user"
+    full_user = cache.get(key)
+    metrics.cache_lookup("token_user", full_user is not None)
+    if full_user is None:
+        full_user = User.objects.get(pk=user.id)
+        cache.set(key, full_user, timeout)
+    return full_user
+
+
+async def aget_full_user(request):
+    user = request.user
+    if isinstance(user, User):
+        return user
+
+    timeout = settings.JWT_USER_CACHE_TIMEOUT
+    if not timeout:
+        return await User.objects.aget(pk=user.id)
+
+    key = f"auth:token:{request.auth['jti']}:user"
+    full_user = await cache.aget(key)
+    metrics.cache_lookup("token_user", full_user is not None)
+    if full_user is None:
+        full_user = await User.objects.aget(pk=user.id)
+        await cache.aset(key, full_user, timeout)
+    return full_user
@@ -0,0 +1,40 @@
+# accounts/management/commands/prune_tokens.py
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from accounts.tokens import blacklist_key
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lt=now).order_by("pk")
+        deleted = 0
+
+        # Short transactions keep the lock on the blacklist tables brief
+        # while refreshes keep running.
+        while True:
+            with transaction.atomic():
+                ids = list(expired.values_list("pk", flat=True)[:batch_size])
+                if not ids:
+                    break
+                blacklisted = BlacklistedToken.objects.filter(token_id__in=ids)
+                jtis = list(blacklisted.values_list("token__jti", flat=True))
+                blacklisted.delete()
+                OutstandingToken.objects.filter(pk__in=ids).delete()
+            cache.delete_many([blacklist_key(jti) for jti in jtis])
+            deleted += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens."))
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="token_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
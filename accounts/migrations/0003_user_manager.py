@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:32
+
+import accounts.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0002_token_version"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="customuser",
+            managers=[
+                ("objects", accounts.models.CustomUserManager()),
+            ],
+        ),
+    ]
@@ -1,7 +1,46 @@
 # accounts/models.py
 
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.cache import cache
+from django.db import models, transaction
+
+# Cached token_version for users that must not authenticate at all
+REVOKED_TOKEN_VERSION = -1
+AUTH_STATE_FIELDS = {"role", "is_active"}
+
+
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Bump token_version like save() does when role or is_active are
+        written, changed or not. Only the rows matched when the update
+        starts are written, so their cached versions can be refreshed.
+        """
+        if not AUTH_STATE_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            ids = list(self.select_for_update().values_list("pk", flat=True))
+            rows = self.model._base_manager.using(self.db).filter(pk__in=ids)
+            count = models.QuerySet.update(
+                rows, token_version=models.F("token_version") + 1, **kwargs
+            )
+            versions = {
+                self.model.token_version_key(pk): (
+                    version if is_active else REVOKED_TOKEN_VERSION
+                )
+                for pk, version, is_active in rows.values_list(
+                    "pk", "token_version", "is_active"
+                )
+            }
+        cache.set_many(versions, settings.JWT_VERSION_CACHE_TIMEOUT)
+        return count
+
+    update.alters_data = True
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
 
 
 class CustomUser(AbstractUser):
@@ -11,10 +50,60 @@ class CustomUser(AbstractUser):
     )
 
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default="user")
+    # Signed into access tokens as the "ver" claim. Bumped whenever role or
+    # is_active changes, which invalidates every token issued before.
+    token_version = models.PositiveIntegerField(default=0)
+
+    objects = CustomUserManager()
 
     def __str__(self):
         return f"{self.username} ({self.role})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if AUTH_STATE_FIELDS <= set(field_names):
+            instance._auth_state = instance._get_auth_state()
+        return instance
+
+    def _get_auth_state(self):
+        return self.role, self.is_active
+
+    def save(self, *args, **kwargs):
+        auth_state = self._get_auth_state()
+        changed = getattr(self, "_auth_state", auth_state) != auth_state
+        if changed:
+            self.token_version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        self._auth_state = auth_state
+        if changed:
+            self.cache_token_version()
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        cache.set(
+            self.token_version_key(user_id),
+            REVOKED_TOKEN_VERSION,
+            settings.JWT_VERSION_CACHE_TIMEOUT,
+        )
+        return result
+
+    @staticmethod
+    def token_version_key(user_id):
+        return f"auth:user:{user_id}:token_version"
+
+    def cache_token_version(self):
+        version = self.token_version if self.is_active else REVOKED_TOKEN_VERSION
+        cache.set(
+            self.token_version_key(self.pk),
+            version,
+            settings.JWT_VERSION_CACHE_TIMEOUT,
+        )
+
     class Meta:
         verbose_name = "User"
         verbose_name_plural = "Users"
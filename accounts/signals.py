@@ -0,0 +1,28 @@
+# accounts/signals.py
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .tokens import blacklist_key
+
+
+# Every blacklist that saves the row, the admin's included, replaces a
+# cached "not blacklisted" right away
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, **kwargs):
+    if settings.JWT_BLACKLIST_CACHE:
+        token = instance.token
+        timeout = (token.expires_at - timezone.now()).total_seconds()
+        cache.set(blacklist_key(token.jti), True, max(int(timeout), 1))
+
+
+# Queryset deletes (prune_tokens) clear the cache once per batch themselves
+# instead of loading each row's token here
+@receiver(post_delete, sender=BlacklistedToken)
+def forget_blacklisted_token(sender, instance, origin=None, **kwargs):
+    if settings.JWT_BLACKLIST_CACHE and origin is instance:
+        cache.delete(blacklist_key(instance.token.jti))
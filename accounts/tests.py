@@ -1,11 +1,31 @@
 # accounts/tests.py
 
 
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken
 
 from django.db import IntegrityError
 
+from config import ratelimit
+
+from .authentication import JWTCookieAuthentication
+from .tokens import UserRefreshToken, blacklist_key
+
 User = get_user_model()
 
 
@@ -36,3 +56,264 @@ class CustomUserModelTest(TestCase):
 
         with self.assertRaises(IntegrityError):
             User.objects.create_user(username="test", password="pass2")
+
+
+class TokenClaimsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass")
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/auth/login/", {"username": "alice", "password": "pass"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def refresh(self):
+        return self.client.post("/api/auth/refresh/")
+
+    def test_claims_signed_into_access_token(self):
+        token = AccessToken(self.client.cookies["access_token"].value)
+        self.assertEqual(token["username"], "alice")
+        self.assertEqual(token["role"], "user")
+        self.assertEqual(token["ver"], 0)
+
+    def test_authenticates_without_user_query(self):
+        # Version lookup is cached after the first request
+        self.client.get("/api/docs/documents/")
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/docs/documents/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_full_user_cached_per_token(self):
+        self.client.get("/api/auth/me/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/auth/me/")
+        self.assertEqual(response.data["username"], "alice")
+        self.assertEqual(response.data["role"], "user")
+
+    def test_role_change_revokes_tokens(self):
+        self.client.get("/api/auth/me/")
+        self.user.role = "admin"
+        self.user.save()
+
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+        self.assertEqual(self.refresh().status_code, 200)
+        response = self.client.get("/api/auth/me/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["role"], "admin")
+
+    def test_deactivation_revokes_tokens(self):
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+        self.assertEqual(self.refresh().status_code, 401)
+
+    def test_queryset_update_revokes_tokens(self):
+        self.client.get("/api/auth/me/")
+        count = User.objects.filter(is_active=True).update(is_active=False)
+
+        self.assertEqual(count, 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True, role="admin")
+        self.assertEqual(self.refresh().status_code, 200)
+        self.assertEqual(self.client.get("/api/auth/me/").data["role"], "admin")
+
+    @override_settings(JWT_STATELESS_USER=False)
+    def test_database_user_mode(self):
+        response = self.client.get("/api/auth/me/")
+        self.assertEqual(response.status_code, 200)
+        self.user.role = "admin"
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+
+
+@override_settings(ROOT_URLCONF="config.urls_async")
+class AsyncMeViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", password="pass")
+        self.client.post("/api/auth/login/", {"username": "alice", "password": "pass"})
+        self.async_client.cookies = self.client.cookies
+
+    def me(self, **kwargs):
+        return async_to_sync(self.async_client.get)("/api/auth/me/", **kwargs)
+
+    def test_me(self):
+        response = self.me()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"id": self.user.id, "username": "alice", "email": "", "role": "user"},
+        )
+        self.assertIn("csrftoken", response.cookies)
+
+    def test_bearer_header(self):
+        token = self.client.cookies["access_token"].value
+        self.async_client.cookies.clear()
+        response = self.me(headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.json()["username"], "alice")
+        response = self.me(headers={"Authorization": "Bearer nonsense"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+
+    def test_revoked_token(self):
+        self.user.role = "admin"
+        self.user.save()
+        response = self.me()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"detail": "Invalid or expired token"})
+
+    @override_settings(JWT_STATELESS_USER=False)
+    def test_database_user_mode(self):
+        self.assertEqual(self.me().json()["username"], "alice")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 401)
+
+
+class RefreshBlacklistTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="bob", password="pass")
+        self.client = APIClient()
+        self.client.post("/api/auth/login/", {"username": "bob", "password": "pass"})
+
+    def test_refresh_skips_blacklist_query(self):
+        refresh = UserRefreshToken(self.client.cookies["refresh_token"].value)
+        with self.assertNumQueries(0):
+            refresh.check_blacklist()
+
+    def test_blacklisting_replaces_cached_answer(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        self.assertIsNone(cache.get(blacklist_key(refresh["jti"])))
+        refresh.outstand()
+        refresh.check_blacklist()
+        self.assertIs(cache.get(blacklist_key(refresh["jti"])), False)
+
+        # As the admin would, bypassing the token class
+        blacklisted = BlacklistedToken.objects.create(
+            token=refresh.outstanding_token()
+        )
+        with self.assertNumQueries(0), self.assertRaises(TokenError):
+            refresh.check_blacklist()
+        blacklisted.delete()
+        refresh.check_blacklist()
+
+    def test_rotated_token_is_rejected(self):
+        old = self.client.cookies["refresh_token"].value
+        self.assertEqual(self.client.post("/api/auth/refresh/").status_code, 200)
+
+        self.client.cookies["refresh_token"] = old
+        self.assertEqual(self.client.post("/api/auth/refresh/").status_code, 401)
+
+    def test_blacklist_checked_in_database_on_cache_miss(self):
+        old = self.client.cookies["refresh_token"].value
+        self.client.post("/api/auth/logout/")
+        cache.clear()
+        with self.assertRaises(TokenError):
+            UserRefreshToken(old)
+
+    def test_prune_tokens(self):
+        for _ in range(3):
+            expired = UserRefreshToken.for_user(self.user)
+            expired.blacklist()
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        live = UserRefreshToken.for_user(self.user)
+
+        out = StringIO()
+        # Nine per batch, however many tokens it holds, and three to find
+        # there are none left; nothing per token
+        with self.assertNumQueries(2 * 9 + 3):
+            call_command("prune_tokens", batch_size=2, stdout=out)
+        self.assertIn("Deleted 4 expired tokens", out.getvalue())
+        self.assertIsNone(cache.get(blacklist_key(expired["jti"])))
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)),
+            [live["jti"]],
+        )
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@override_settings(
+    RATELIMIT_ENABLED=True,
+    NUM_PROXIES=1,
+    RATELIMITS={
+        "login": {"ip": "4/m", "username": "2/m"},
+        "register": {"ip": "2/m"},
+    },
+)
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username="alice", password="pass")
+        self.client = APIClient()
+
+    def login(self, username, ip="10.0.0.1"):
+        return self.client.post(
+            "/api/auth/login/",
+            {"username": username, "password": "wrong"},
+            HTTP_X_FORWARDED_FOR=ip,
+        )
+
+    def test_username_budget(self):
+        self.assertEqual(self.login("alice").status_code, 401)
+        self.assertEqual(self.login("Alice ", ip="10.0.0.2").status_code, 401)
+        with mock.patch("accounts.views.authenticate") as authenticate:
+            response = self.login("alice", ip="10.0.0.3")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.data, {"error": "Too many requests"})
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        authenticate.assert_not_called()
+        self.assertEqual(self.login("bob", ip="10.0.0.3").status_code, 401)
+
+    def test_limited_before_authentication(self):
+        # A stale cookie doesn't get in the way of logging in again
+        self.client.cookies["access_token"] = "stale"
+        response = self.client.post(
+            "/api/auth/login/", {"username": "alice", "password": "pass"}
+        )
+        self.assertEqual(response.status_code, 200)
+        with mock.patch.object(JWTCookieAuthentication, "authenticate") as auth:
+            self.assertEqual(self.login("alice").status_code, 401)
+            self.assertEqual(self.login("alice").status_code, 429)
+        auth.assert_not_called()
+
+    def test_ip_budget(self):
+        for i in range(4):
+            self.assertEqual(self.login(f"user{i}").status_code, 401)
+        self.assertEqual(self.login("user9").status_code, 429)
+        self.assertEqual(self.login("user9", ip="10.0.0.2").status_code, 401)
+
+    def test_register_budget(self):
+        def register(username, forwarded):
+            return self.client.post(
+                "/api/auth/register/",
+                {"username": username, "password": "pass"},
+                HTTP_X_FORWARDED_FOR=forwarded,
+            )
+
+        self.assertEqual(register("u1", "10.0.0.1").status_code, 201)
+        self.assertEqual(register("u2", "10.0.0.1").status_code, 201)
+        response = register("u3", "10.0.0.1")
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(User.objects.filter(username="u3").exists())
+        # Entries the client adds itself are left of the proxy's and ignored
+        self.assertEqual(register("u3", "1.2.3.4, 10.0.0.1").status_code, 429)
+
+    def test_sliding_window(self):
+        # 10 requests in the previous minute, none yet in this one
+        for _ in range(10):
+            ratelimit.hit("test", "10/m", now=60 * 100 + 30)
+        # Half of the previous window still counts at 50% into this one,
+        # which leaves room for 5 more
+        now = 60 * 101 + 30
+        for _ in range(5):
+            self.assertEqual(ratelimit.hit("test", "10/m", now=now), 0)
+        wait = ratelimit.hit("test", "10/m", now=now)
+        # By then 3 of the previous window's 10 still count, next to 6
+        self.assertEqual(wait, 12)
+        self.assertEqual(ratelimit.hit("test", "10/m", now=now + wait), 0)
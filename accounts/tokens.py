@@ -0,0 +1,154 @@
+# accounts/tokens.py
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from config import metrics
+
+from .models import REVOKED_TOKEN_VERSION
+
+User = get_user_model()
+
+VERSION_CLAIM = "ver"
+
+
+def set_user_claims(token, user):
+    """
+    Sign what request handling needs to know about the user into the token,
+    so JWTCookieAuthentication can build the user without a query.
+    """
+    token["username"] = user.username
+    token["role"] = user.role
+    token[VERSION_CLAIM] = user.token_version
+
+
+def current_token_version(user_id):
+    """
+    The token_version tokens for this user must carry, or
+    REVOKED_TOKEN_VERSION if the user is inactive or gone.
+    """
+    key = User.token_version_key(user_id)
+    version = cache.get(key)
+    metrics.cache_lookup("token_version", version is not None)
+    if version is None:
+        row = User.objects.filter(pk=user_id).values_list("token_version", "is_active")
+        version, is_active = row.first() or (REVOKED_TOKEN_VERSION, False)
+        if not is_active:
+            version = REVOKED_TOKEN_VERSION
+        cache.set(key, version, settings.JWT_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+async def acurrent_token_version(user_id):
+    key = User.token_version_key(user_id)
+    version = await cache.aget(key)
+    metrics.cache_lookup("token_version", version is not None)
+    if version is None:
+        row = User.objects.filter(pk=user_id).values_list("token_version", "is_active")
+        version, is_active = await row.afirst() or (REVOKED_TOKEN_VERSION, False)
+        if not is_active:
+            version = REVOKED_TOKEN_VERSION
+        await cache.aset(key, version, settings.JWT_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def blacklist_key(jti):
+    return f"auth:jti:{jti}:blacklisted"
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist state is cached. Blacklisting caches a
+    "yes" until the token expires (see accounts.signals); a "no" read from
+    the database is cached for JWT_BLACKLIST_CACHE_TIMEOUT only, which bounds
+    how long a blacklist that skips the signal goes unnoticed.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        return token
+
+    def check_blacklist(self):
+        key = blacklist_key(self.payload[api_settings.JTI_CLAIM])
+        blacklisted = None
+        if settings.JWT_BLACKLIST_CACHE:
+            blacklisted = cache.get(key)
+            metrics.cache_lookup("token_blacklist", blacklisted is not None)
+        if blacklisted is None:
+            jti = self.payload[api_settings.JTI_CLAIM]
+            blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+            if settings.JWT_BLACKLIST_CACHE and not blacklisted:
+                # add() so a concurrent blacklist is never overwritten
+                cache.add(key, False, settings.JWT_BLACKLIST_CACHE_TIMEOUT)
+        if blacklisted:
+            raise TokenError("Token is blacklisted")
+
+    def outstanding_token(self):
+        # The user id comes from a verified token, so it isn't looked up
+        # again the way simplejwt's own outstand()/blacklist() do.
+        token, _ = OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                "user_id": self.payload.get(api_settings.USER_ID_CLAIM),
+                "created_at": self.current_time,
+                "token": str(self),
+                "expires_at": datetime_from_epoch(self.payload["exp"]),
+            },
+        )
+        return token
+
+    def outstand(self):
+        return self.outstanding_token()
+
+    def blacklist(self):
+        return BlacklistedToken.objects.get_or_create(token=self.outstanding_token())
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-signs the claims from the current user row on every refresh, so a
+    role change reaches the next access token and inactive users can't
+    refresh at all.
+    """
+
+    token_class = UserRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"],
+                "no_active_account",
+            )
+        set_user_claims(refresh, user)
+
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+
+            data["refresh"] = str(refresh)
+
+        return data
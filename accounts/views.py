@@ -1,30 +1,35 @@
 # accounts/views.py
 
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import authenticate
 from django.conf import settings
 from django.contrib.auth import get_user_model
-# from django_ratelimit.decorators import ratelimit
 from django.views.decorators.csrf import ensure_csrf_cookie
 
+from config.ratelimit import ratelimit
+
+from .authentication import get_full_user
+from .tokens import UserRefreshToken, UserTokenRefreshSerializer
+
 User = get_user_model()
 
 
+# No authentication: it would run before the rate limit, and a stale
+# access cookie must not turn a login into a 401
 @api_view(["POST"])
+@authentication_classes([])
 @permission_classes([AllowAny])
-# @ratelimit(key='config.settings.get_real_ip', rate="5/m", method="POST")
+@ratelimit("register")
 def register_view(request):
-    if getattr(request, "limited", False):
-        return Response(
-            {"error": "Too many requests"}, status=status.HTTP_429_TOO_MANY_REQUESTS
-        )
-
     username = request.data.get("username")
     email = request.data.get("email")
     password = request.data.get("password")
@@ -58,14 +63,10 @@ def register_view(request):
 
 
 @api_view(["POST"])
+@authentication_classes([])
 @permission_classes([AllowAny])
-# @ratelimit(key='config.settings.get_real_ip', rate="5/m", method="POST")
+@ratelimit("login")
 def login_view(request):
-    if getattr(request, "limited", False):
-        return Response(
-            {"error": "Too many requests"}, status=status.HTTP_429_TOO_MANY_REQUESTS
-        )
-
     username = request.data.get("username")
     password = request.data.get("password")
 
@@ -76,7 +77,7 @@ def login_view(request):
             {"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED
         )
 
-    refresh = RefreshToken.for_user(user)
+    refresh = UserRefreshToken.for_user(user)
 
     response = Response(
         {
@@ -117,7 +118,7 @@ def logout_view(request):
     try:
         refresh_token = request.COOKIES.get("refresh_token")
         if refresh_token:
-            token = RefreshToken(refresh_token)
+            token = UserRefreshToken(refresh_token)
             token.blacklist()
     except (InvalidToken, TokenError):
         pass
@@ -134,7 +135,7 @@ def logout_view(request):
 @permission_classes([IsAuthenticated])
 @ensure_csrf_cookie
 def me_view(request):
-    user = request.user
+    user = get_full_user(request)
     return Response(
         {
             "id": user.id,
@@ -146,6 +147,8 @@ def me_view(request):
 
 
 class CookieTokenRefreshView(TokenRefreshView):
+    serializer_class = UserTokenRefreshSerializer
+
     def post(self, request, *args, **kwargs):
         refresh_token = request.COOKIES.get("refresh_token")
 
@@ -154,7 +157,10 @@ class CookieTokenRefreshView(TokenRefreshView):
 
         data = {"refresh": refresh_token}
         serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
 
         access_token = serializer.validated_data.get("access")
         new_refresh = serializer.validated_data.get("refresh")
@@ -5,5 +5,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Serve the read paths with the async views (see config/urls_async.py)
+os.environ.setdefault("ROOT_URLCONF", "config.urls_async")
 
 application = get_asgi_application()
@@ -0,0 +1,70 @@
+# config/async_views.py
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from accounts.authentication import JWTCookieAuthentication
+
+renderer = JSONRenderer()
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        renderer.render(data), status=status, content_type="application/json"
+    )
+
+
+def error_response(request, exc, authenticator):
+    """What DRF's exception handler answers for `exc`."""
+    if isinstance(exc, Http404):
+        exc = NotFound(*exc.args)
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    response = json_response(data, exc.status_code)
+    if exc.status_code == 401:
+        response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+    return response
+
+
+def async_api_view(fallback):
+    """
+    Serve GET and HEAD with an async view and everything else with
+    `fallback`, the sync DRF view for the same URL.
+
+    The async view gets a DRF Request that has already been authenticated
+    with JWTCookieAuthentication.aauthenticate(). As with IsAuthenticated,
+    anonymous requests get a 401. APIException and Http404 are answered
+    with JSON, as DRF answers them. Responses are always JSON; there is no
+    browsable API.
+    """
+
+    def decorator(view):
+        authenticator = JWTCookieAuthentication()
+
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+
+            request = Request(request)
+            try:
+                result = await authenticator.aauthenticate(request)
+                if result is None:
+                    raise NotAuthenticated()
+                request.user, request.auth = result
+                return await view(request, *args, **kwargs)
+            except (APIException, Http404) as exc:
+                return error_response(request, exc, authenticator)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,255 @@
+# config/cache.py
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+]
+
+# Matches rows that haven't expired; NULL means "never expires"
+LIVE = "(expires IS NULL OR expires > ?)"
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache shared by every worker process on one host.
+
+    Entries live in a SQLite file in WAL mode, so readers never block the
+    writer and all gunicorn workers see each other's writes and
+    invalidations. Reads go through a memory-mapped view of the file.
+    add() and incr() are atomic across processes, and entries are evicted
+    least-recently-used first once MAX_ENTRIES or MAX_SIZE (bytes) is
+    exceeded.
+
+        CACHES = {
+            "default": {
+                "BACKEND": "config.cache.SQLiteCache",
+                "LOCATION": "/var/tmp/bp-cache.sqlite3",
+                "OPTIONS": {"MAX_ENTRIES": 10000, "MAX_SIZE": 64 * 1024 * 1024},
+            }
+        }
+    """
+
+    # Access times are only rewritten when older than this, so hot reads
+    # don't turn into a write each
+    ACCESS_RESOLUTION = 10
+    # Bounds are checked every this many writes per process
+    CULL_EVERY = 64
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.location = str(location)
+        self.max_size = int(options.get("MAX_SIZE", 64 * 1024 * 1024))
+        self.mmap_size = int(options.get("MMAP_SIZE", 256 * 1024 * 1024))
+        self.busy_timeout = float(options.get("BUSY_TIMEOUT", 5))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def connection(self):
+        # One connection per thread, reopened after a fork so workers never
+        # share a handle inherited from the master process.
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            self._local.connection = self._connect()
+            self._local.pid = pid
+        return self._local.connection
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.location,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def _write(self):
+        """
+        BEGIN IMMEDIATE takes the write lock up front, so read-modify-write
+        sequences inside it are atomic across processes.
+        """
+        return _Transaction(self.connection)
+
+    def _expires(self, timeout):
+        # Absolute expiry time, or None to keep the entry until evicted
+        return self.get_backend_timeout(timeout)
+
+    def _pack(self, value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _store(self, connection, key, value, timeout):
+        data = self._pack(value)
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, accessed, size) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, data, self._expires(timeout), time.time(), len(data)),
+        )
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.CULL_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        now = time.time()
+        with self._write() as connection:
+            connection.execute(
+                "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,)
+            )
+            count, size = self._usage(connection)
+            if not self._cull_frequency and (
+                count > self._max_entries or size > self.max_size
+            ):
+                # CULL_FREQUENCY = 0 means "drop everything", as in Django
+                connection.execute("DELETE FROM cache")
+                return
+            if count > self._max_entries:
+                # Drop the least recently used rows down to 1/CULL_FREQUENCY
+                # below the bound, like Django's file and database caches.
+                excess = count - self._max_entries
+                excess += self._max_entries // self._cull_frequency
+                self._evict(connection, excess)
+                count, size = self._usage(connection)
+            while count and size > self.max_size:
+                self._evict(connection, max(count // self._cull_frequency, 1))
+                count, size = self._usage(connection)
+
+    def _usage(self, connection):
+        return connection.execute(
+            "SELECT count(*), coalesce(sum(size), 0) FROM cache"
+        ).fetchone()
+
+    def _evict(self, connection, count):
+        connection.execute(
+            "DELETE FROM cache WHERE key IN "
+            "(SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+            (count,),
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        row = self.connection.execute(
+            f"SELECT value, accessed FROM cache WHERE key = ? AND {LIVE}", (key, now)
+        ).fetchone()
+        if row is None:
+            return default
+        value, accessed = row
+        if now - accessed > self.ACCESS_RESOLUTION:
+            self.connection.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as connection:
+            self._store(connection, key, value, timeout)
+        self._wrote()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        data = self._pack(value)
+        now = time.time()
+        # A single UPSERT that only overwrites expired rows, so exactly one
+        # of several concurrent add() calls wins.
+        cursor = self.connection.execute(
+            "INSERT INTO cache (key, value, expires, accessed, size) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires = excluded.expires, accessed = excluded.accessed, "
+            "size = excluded.size "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, data, self._expires(timeout), now, len(data), now),
+        )
+        added = cursor.rowcount == 1
+        if added:
+            self._wrote()
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self.connection.execute(
+            f"UPDATE cache SET expires = ?, accessed = ? WHERE key = ? AND {LIVE}",
+            (self._expires(timeout), now, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as connection:
+            row = connection.execute(
+                f"SELECT value FROM cache WHERE key = ? AND {LIVE}", (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = self._pack(value)
+            connection.execute(
+                "UPDATE cache SET value = ?, size = ? WHERE key = ?",
+                (data, len(data), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            f"SELECT 1 FROM cache WHERE key = ? AND {LIVE}", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as connection:
+            for key, value in data.items():
+                key = self.make_and_validate_key(key, version=version)
+                self._store(connection, key, value, timeout)
+        self._wrote()
+        return []
+
+    def clear(self):
+        self.connection.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # Connections are kept per thread for the life of the worker
+        pass
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,229 @@
+# config/metrics.py
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+# Prometheus' default buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+METRICS = {
+    "http_requests_total": ("counter", "Requests by route, method and status."),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Request latency by route and method.",
+    ),
+    "http_request_db_queries": ("histogram", "SQL statements per request by route."),
+    "cache_lookups_total": ("counter", "Cache reads by cache and result."),
+    "cache_hit_ratio": ("gauge", "Hits / lookups by cache since the store was reset."),
+    "ratelimit_rejections_total": ("counter", "Requests refused by the rate limiter."),
+}
+BUCKETS = {
+    "http_request_duration_seconds": LATENCY_BUCKETS,
+    "http_request_db_queries": QUERY_BUCKETS,
+}
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """
+    Counters and histograms of one process, kept in memory and written to
+    METRICS_DIR/<pid>-<id>.json at most every METRICS_FLUSH_INTERVAL
+    seconds. The endpoint adds up the files of every worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        # Not the pid alone: a restarted worker may get the pid of a dead
+        # one, whose totals must not be overwritten.
+        self.filename = f"{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        self.counters = defaultdict(float)
+        # (name, labels) -> [count per bucket..., count above the last, sum]
+        self.histograms = {}
+        self.flushed_at = time.monotonic()
+
+    def check_fork(self):
+        # A forked worker starts from zero; its parent reports its own totals
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.reset()
+
+    def inc(self, name, labels, value=1):
+        self.check_fork()
+        with self.lock:
+            self.counters[name, labels_key(labels)] += value
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        self.check_fork()
+        buckets = BUCKETS[name]
+        with self.lock:
+            key = name, labels_key(labels)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, dict(labels), list(values)]
+                    for (name, labels), values in self.histograms.items()
+                ],
+            }
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush(wait=False)
+
+    def flush(self, wait=True):
+        # One writer at a time, so an older snapshot never replaces a newer one
+        if not self.flush_lock.acquire(blocking=wait):
+            return
+        try:
+            self.flushed_at = time.monotonic()
+            directory = Path(settings.METRICS_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, directory / self.filename)
+        finally:
+            self.flush_lock.release()
+
+
+registry = Registry()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Management commands and forked processes that served nothing leave
+    # no file behind
+    if registry.pid == os.getpid() and (registry.counters or registry.histograms):
+        registry.flush()
+
+
+def route(request):
+    match = request.resolver_match
+    if match is None:
+        return "unmatched"
+    # Named routes by name, the rest by pattern; never the raw path, which
+    # would make a series per document
+    return match.view_name if match.url_name else match.route
+
+
+def observe_request(request, response, timing, total):
+    if not settings.METRICS_ENABLED:
+        return
+    labels = {"route": route(request), "method": request.method}
+    registry.inc("http_requests_total", {**labels, "status": str(response.status_code)})
+    registry.observe("http_request_duration_seconds", labels, total)
+    registry.observe(
+        "http_request_db_queries", {"route": labels["route"]}, timing.queries
+    )
+
+
+def inc(name, labels):
+    if settings.METRICS_ENABLED:
+        registry.inc(name, labels)
+
+
+def cache_lookup(name, hit):
+    inc("cache_lookups_total", {"cache": name, "result": "hit" if hit else "miss"})
+
+
+def collect():
+    """Totals of every process that has written to METRICS_DIR."""
+    registry.flush()
+    counters = defaultdict(float)
+    histograms = {}
+    for path in Path(settings.METRICS_DIR).glob("*.json"):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        for name, labels, value in data["counters"]:
+            counters[name, labels_key(labels)] += value
+        for name, labels, values in data["histograms"]:
+            key = name, labels_key(labels)
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = values
+    return counters, histograms
+
+
+def format_labels(labels):
+    def escape(value):
+        return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(str(v))}"' for k, v in labels) + "}"
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render():
+    """The Prometheus text exposition format (0.0.4)."""
+    counters, histograms = collect()
+
+    lookups = defaultdict(lambda: [0.0, 0.0])
+    for (name, labels), value in counters.items():
+        if name == "cache_lookups_total":
+            label = dict(labels)
+            lookups[label["cache"]][label["result"] == "hit"] += value
+    gauges = {
+        ("cache_hit_ratio", (("cache", cache),)): hits / (hits + misses)
+        for cache, (misses, hits) in lookups.items()
+    }
+
+    series = defaultdict(list)
+    for (name, labels), value in sorted({**counters, **gauges}.items()):
+        series[name].append(f"{name}{format_labels(labels)} {format_value(value)}")
+    for (name, labels), values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*BUCKETS[name], "+Inf"), values[:-1]):
+            cumulative += count
+            le = labels + (("le", format_value(bound) if bound != "+Inf" else bound),)
+            series[name].append(f"{name}_bucket{format_labels(le)} {cumulative}")
+        series[name].append(
+            f"{name}_sum{format_labels(labels)} {format_value(values[-1])}"
+        )
+        series[name].append(f"{name}_count{format_labels(labels)} {cumulative}")
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        if series[name]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += series[name]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,260 @@
+# config/middleware.py
+
+import json
+import logging
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponseNotFound
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import MissingFileError
+
+from . import metrics, replicas, timing
+
+logger = logging.getLogger("config.requests")
+
+
+class PrerenderWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also serves PRERENDER_ROOT under PRERENDER_URL.
+
+    Snapshots are written while the server runs, so that prefix is looked up
+    on disk per request instead of from the index WhiteNoise builds at
+    startup. Snapshot files have content-hashed names and are cached
+    forever; the manifest is revalidated on every use.
+
+    Unlike WhiteNoiseMiddleware it also runs as async middleware, so async
+    views under ASGI aren't moved onto a thread on its account.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.find_response(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        response = self.find_response(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def find_response(self, request):
+        """The file response for `request`, or None to pass it on."""
+        if request.path_info.startswith(settings.PRERENDER_URL):
+            static_file = None
+            if settings.PRERENDER_ENABLED:
+                static_file = self.find_prerendered(request.path_info)
+            if static_file is None:
+                # Not the SPA shell: clients fall back to the API on a 404
+                return HttpResponseNotFound()
+            return self.serve(static_file, request)
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return None
+
+    def find_prerendered(self, url):
+        if not self.url_is_canonical(url):
+            return None
+        root = os.path.join(os.path.abspath(settings.PRERENDER_ROOT), "")
+        path = os.path.join(root, url[len(settings.PRERENDER_URL) :])
+        name = os.path.basename(path)
+        if name.startswith(".") or not self.path_is_child_of(path, root):
+            return None
+        try:
+            return self.get_static_file(path, url)
+        except (MissingFileError, IsADirectoryError, OSError):
+            return None
+
+    def add_cache_headers(self, headers, path, url):
+        if not url.startswith(settings.PRERENDER_URL):
+            return super().add_cache_headers(headers, path, url)
+        if url.endswith("/manifest.json"):
+            headers["Cache-Control"] = "no-cache"
+        else:
+            headers["Cache-Control"] = f"max-age={self.FOREVER}, public, immutable"
+        if url.endswith(".html"):
+            # Snapshot markup is admin-authored HTML; never let it run scripts
+            headers["Content-Security-Policy"] = "script-src 'none'"
+
+
+class RequestTimingMiddleware:
+    """
+    Times each request: SQL (count and duration, through an execute wrapper
+    on every connection), authentication, the view and response rendering.
+
+    With SERVER_TIMING on, the figures go out in a Server-Timing header.
+    Every request is counted in config.metrics.
+    Requests slower than SLOW_REQUEST_MS are logged to "config.requests" as
+    one JSON object, with the statements that ran more than once so N+1
+    loops stand out.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(timing.install, dispatch_uid="config.timing")
+        for connection in connections.all(initialized_only=True):
+            timing.install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = timing.RequestTiming()
+        request._timing = state
+        token = timing.activate(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = timing.RequestTiming()
+        request._timing = state
+        token = timing.activate(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        now = time.perf_counter()
+        view_start = getattr(state, "view_start", None)
+        if view_start is not None:
+            # DRF authenticates inside the view; that time is reported as
+            # "auth" only.
+            view = getattr(state, "view_end", now) - view_start
+            state.add("view", max(view - state.spans.get("auth", 0.0), 0.0))
+        total = now - state.start
+
+        if settings.SERVER_TIMING:
+            response.headers["Server-Timing"] = self.server_timing(state, total)
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(json.dumps(self.record(request, response, state, total)))
+        metrics.observe_request(request, response, state, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; that time is
+        # reported as "render", not "view".
+        state = request._timing
+        state.view_end = time.perf_counter()
+
+        def rendered(response):
+            state.add("render", time.perf_counter() - state.view_end)
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def server_timing(state, total):
+        metrics = [f'db;dur={state.sql_time * 1000:.1f};desc="{state.queries} queries"']
+        for name in ("auth", "view", "render"):
+            if name in state.spans:
+                metrics.append(f"{name};dur={state.spans[name] * 1000:.1f}")
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+    @staticmethod
+    def record(request, response, state, total):
+        return {
+            "event": "slow_request",
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            **{
+                f"{name}_ms": round(duration * 1000, 2)
+                for name, duration in sorted(state.spans.items())
+            },
+            "db_ms": round(state.sql_time * 1000, 2),
+            "queries": state.queries,
+            "repeated_sql": state.repeated_sql(),
+        }
+
+
+class ReplicaMiddleware:
+    """
+    Sends the content reads of GET and HEAD requests to a read replica when
+    the view is marked with config.replicas.replica_reads and
+    REPLICA_DATABASES lists any.
+
+    A successful write sets a cookie that keeps the client on the primary
+    for REPLICA_PIN_SECONDS, so it reads its own writes while the replicas
+    catch up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request._replica_routing = replicas.Routing()
+        token = replicas.activate(request._replica_routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.deactivate(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        request._replica_routing = replicas.Routing()
+        token = replicas.activate(request._replica_routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.deactivate(token)
+        return self.finish(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if replicas.allows_replica(view_func):
+            request._replica_routing.replica = replicas.choose(request)
+
+    def finish(self, request, response):
+        if (
+            settings.REPLICA_DATABASES
+            and request.method not in replicas.READ_METHODS + ("OPTIONS",)
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                replicas.PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                secure=not settings.DEBUG,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,132 @@
+# config/ratelimit.py
+
+import functools
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+
+UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'5/m' -> (5, 60)"""
+    count, _, unit = rate.partition("/")
+    return int(count), UNITS[unit]
+
+
+def get_real_ip(request):
+    """
+    The client address as seen by the outermost of the NUM_PROXIES proxies
+    in front of the app. Each proxy appends the address it was connected
+    from to X-Forwarded-For, so only that many entries from the right can be
+    trusted; anything left of them came from the client.
+    """
+    if settings.NUM_PROXIES:
+        forwarded = [
+            address.strip()
+            for address in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if address.strip()
+        ]
+        if len(forwarded) >= settings.NUM_PROXIES:
+            return forwarded[-settings.NUM_PROXIES]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def get_username(request):
+    username = request.data.get("username")
+    if not isinstance(username, str) or not username.strip():
+        return None
+    # Fixed-length keys whatever was submitted
+    return hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+
+
+KEYS = {"ip": get_real_ip, "username": get_username}
+
+
+def hit(name, rate, now=None):
+    """
+    Count one request against `rate` for the counter `name` and return how
+    many seconds to wait before the next one is allowed, or 0 if this one is.
+
+    A sliding window counter: the count of the current fixed window plus
+    that of the previous one, weighted by how much of it still lies within
+    the last period. The counters only ever go through cache.add() and
+    cache.incr(), which are atomic across workers, so a burst can't slip
+    through between a read and a write.
+    """
+    limit, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, period)
+    current_key = f"ratelimit:{name}:{int(window)}"
+
+    cache.add(current_key, 0, period * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(current_key, 1, period * 2)
+        current = 1
+    previous = cache.get(f"ratelimit:{name}:{int(window) - 1}", 0)
+
+    if previous * (1 - elapsed / period) + current <= limit:
+        return 0
+    return retry_after(previous, current, limit, period, elapsed)
+
+
+def retry_after(previous, current, limit, period, elapsed):
+    """Seconds until one more request fits, if nothing else arrives."""
+    if current < limit and previous:
+        # Later in this window, once enough of `previous` has slid out
+        wait = period * (1 - (limit - current - 1) / previous) - elapsed
+    else:
+        # In the next window, when this window's count is the one sliding out
+        wait = period - elapsed + max(period * (1 - (limit - 1) / current), 0)
+    return max(math.ceil(wait), 1)
+
+
+def check(scope, request):
+    """Count `request` against every RATELIMITS[scope] budget; see hit()."""
+    wait = 0
+    for key, rate in settings.RATELIMITS.get(scope, {}).items():
+        if key not in KEYS:
+            raise ImproperlyConfigured(f"Unknown rate limit key '{key}'.")
+        value = KEYS[key](request)
+        if value is not None:
+            wait = max(wait, hit(f"{scope}:{key}:{value}", rate))
+    return wait
+
+
+def ratelimit(scope):
+    """
+    Answer requests over the RATELIMITS[scope] budgets with a 429 and a
+    Retry-After header before the view does any work. Goes below @api_view,
+    as budgets keyed by username read it from request.data; DRF
+    authenticates before calling it, so limited views should have no
+    authentication_classes.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLED:
+                wait = check(scope, request)
+                if wait:
+                    metrics.inc("ratelimit_rejections_total", {"scope": scope})
+                    return Response(
+                        {"error": "Too many requests"},
+                        status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": str(wait)},
+                    )
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
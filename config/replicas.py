@@ -0,0 +1,89 @@
+# config/replicas.py
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Set on a successful write; while it lasts the client reads from the
+# primary
+PIN_COOKIE = "pin_primary"
+READ_METHODS = ("GET", "HEAD")
+# Only content is read from replicas. Users and token versions stay on the
+# primary, so a lagging replica can't accept a token revoked a moment ago.
+REPLICATED_APPS = {"docs"}
+
+_current = ContextVar("replica_routing", default=None)
+
+
+class Routing:
+    """
+    Where one request's reads go. ReplicaMiddleware installs it for the
+    request and picks a replica once the view is known to allow it.
+    """
+
+    def __init__(self):
+        self.replica = None
+
+
+def replica_reads(view):
+    """
+    Let the GET and HEAD requests of `view`, a view function or class, read
+    from a replica.
+    """
+    view.replica_reads = True
+    return view
+
+
+def allows_replica(view_func):
+    # as_view() functions carry their class as .cls
+    return getattr(getattr(view_func, "cls", view_func), "replica_reads", False)
+
+
+def choose(request):
+    """A replica alias for `request`, or None for the primary."""
+    if (
+        settings.REPLICA_DATABASES
+        and request.method in READ_METHODS
+        and PIN_COOKIE not in request.COOKIES
+    ):
+        return random.choice(settings.REPLICA_DATABASES)
+    return None
+
+
+def current():
+    return _current.get()
+
+
+def activate(routing):
+    return _current.set(routing)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads of REPLICATED_APPS models go to the replica picked for the
+    request, everything else and every write to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None or routing.replica is None:
+            return None
+        if model._meta.app_label not in REPLICATED_APPS:
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
@@ -38,19 +38,22 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "config.middleware.PrerenderWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "config.middleware.ReplicaMiddleware",
 ]
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
-ROOT_URLCONF = "config.urls"
+# config.urls under WSGI; config/asgi.py switches to config.urls_async
+ROOT_URLCONF = os.environ.get("ROOT_URLCONF", "config.urls")
 
 TEMPLATES = [
     {
@@ -91,12 +94,58 @@ else:
         }
     }
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+# Comma-separated URLs of read replicas of the default database, e.g.
+# "sqlite:///replica.sqlite3" locally. Documents and blocks are read from
+# them; see config.replicas.
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+REPLICA_DATABASES = []
+
+if "test" in sys.argv:
+    # A second database for the routing tests, which turn replicas on
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+else:
+    import dj_database_url
+
+    for index, url in enumerate(DATABASE_REPLICA_URLS):
+        DATABASES[f"replica_{index}"] = dj_database_url.parse(url, conn_max_age=60)
+        REPLICA_DATABASES.append(f"replica_{index}")
+
+DATABASE_ROUTERS = ["config.replicas.ReplicaRouter"]
+
+# How long a client that wrote reads from the primary only; at least the
+# replicas' usual lag
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 10))
+
+# "shared": one SQLite/WAL file used by every gunicorn worker on the host
+# "locmem": per-process memory, invalidations aren't seen by other workers
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "shared")
+
+if CACHE_BACKEND == "shared" and "test" not in sys.argv:
+    CACHES = {
+        "default": {
+            "BACKEND": "config.cache.SQLiteCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", BASE_DIR / "cache.sqlite3"),
+            "TIMEOUT": 300,
+            "OPTIONS": {
+                "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+                "MAX_SIZE": int(os.environ.get("CACHE_MAX_SIZE", 64 * 1024 * 1024)),
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "unique-snowflake",
+        }
     }
-}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -129,6 +178,50 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Static JSON/HTML snapshots of published documents (manage.py prerender).
+# Enabling this serves them without authentication and rebuilds them after
+# every document change.
+PRERENDER_ENABLED = os.environ.get("PRERENDER_ENABLED", "False") == "True"
+
+PRERENDER_ROOT = os.environ.get("PRERENDER_ROOT", BASE_DIR / "prerender")
+
+PRERENDER_URL = "/prerender/"
+
+# Server-Timing header with db/auth/view/render durations on every response
+SERVER_TIMING = os.environ.get("SERVER_TIMING", str(DEBUG)) == "True"
+
+# Requests slower than this are logged to "config.requests" with their SQL
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+
+# Prometheus metrics at /api/metrics/ (admins only). Each worker writes its
+# totals to its own file in METRICS_DIR at most every METRICS_FLUSH_INTERVAL
+# seconds; clear the directory when the server starts.
+METRICS_ENABLED = (
+    os.environ.get("METRICS_ENABLED", "True") == "True" and "test" not in sys.argv
+)
+
+METRICS_DIR = os.environ.get("METRICS_DIR", BASE_DIR / "metrics")
+
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+# Off under tests, where every password hash makes a slow request; tests
+# of the log capture it with assertLogs
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "null": {"class": "logging.NullHandler"},
+    },
+    "loggers": {
+        "config.requests": {
+            "handlers": ["console" if "test" not in sys.argv else "null"],
+            "level": "INFO",
+            "propagate": "test" not in sys.argv,
+        },
+    },
+}
+
 AUTH_USER_MODEL = "accounts.CustomUser"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -146,6 +239,30 @@ SIMPLE_JWT = {
     "AUTH_COOKIE_SAMESITE": "Lax",
 }
 
+# Build request.user from the id/username/role claims instead of a query per
+# request; role changes and deactivation revoke tokens via the "ver" claim.
+# The versions live in the cache, so this is only safe when every worker
+# shares it: with per-process caches a revoked token stays valid in the
+# workers that still hold the old version.
+JWT_STATELESS_USER = (
+    os.environ.get("JWT_STATELESS_USER", str(CACHE_BACKEND == "shared")) == "True"
+)
+
+# Seconds the full user row is cached per access token (0 disables)
+JWT_USER_CACHE_TIMEOUT = int(os.environ.get("JWT_USER_CACHE_TIMEOUT", 60))
+
+JWT_VERSION_CACHE_TIMEOUT = int(os.environ.get("JWT_VERSION_CACHE_TIMEOUT", 300))
+
+# Mirror refresh-token blacklist state in the cache. Only safe when every
+# worker that serves /api/auth/ shares that cache.
+JWT_BLACKLIST_CACHE = (
+    os.environ.get("JWT_BLACKLIST_CACHE", str(CACHE_BACKEND == "shared")) == "True"
+)
+
+# Seconds a "not blacklisted" answer is cached; blacklisting through the ORM
+# replaces it at once, bulk inserts only when it expires
+JWT_BLACKLIST_CACHE_TIMEOUT = int(os.environ.get("JWT_BLACKLIST_CACHE_TIMEOUT", 60))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "accounts.authentication.JWTCookieAuthentication",
@@ -169,19 +286,23 @@ CSRF_TRUSTED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
-# RATELIMIT_USE_CACHE = "default"
-
-# RATELIMIT_ENABLE = True
-
 USE_X_FORWARDED_HOST = True
 
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
-# def get_real_ip(request):
-#     """Extract real client IP from nginx X-Forwarded-For header"""
-#     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-#     if x_forwarded_for:
-#         return x_forwarded_for.split(',')[0].strip()
-#     return request.META.get('REMOTE_ADDR', '127.0.0.1')
-
-# RATELIMIT_VIEW = 'config.settings.get_real_ip'
\ No newline at end of file
+# Proxies in front of the app that append to X-Forwarded-For (nginx: 1);
+# config.ratelimit.get_real_ip trusts that many entries from the right
+NUM_PROXIES = int(os.environ.get("NUM_PROXIES", 1))
+
+# Budgets for the views that hash passwords, per client IP and per submitted
+# username, as "<requests>/<s|m|h|d>" over a sliding window. Counters live
+# in the default cache, so they are shared by every worker with the
+# "shared" backend.
+RATELIMIT_ENABLED = (
+    os.environ.get("RATELIMIT_ENABLED", "True") == "True" and "test" not in sys.argv
+)
+
+RATELIMITS = {
+    "login": {"ip": "20/m", "username": "5/m"},
+    "register": {"ip": "5/m"},
+}
\ No newline at end of file
@@ -0,0 +1,359 @@
+# config/tests.py
+
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, router
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from docs.models import Document, DocumentBlock, Like
+
+from . import metrics, replicas
+from .cache import SQLiteCache
+from .timing import RequestTiming
+
+User = get_user_model()
+
+
+def make_cache(location, **options):
+    return SQLiteCache(location, {"OPTIONS": options})
+
+
+def increment(location, times):
+    cache = make_cache(location)
+    for _ in range(times):
+        cache.incr("counter")
+
+
+def try_add(location, results):
+    results.put(make_cache(location).add("lock", os.getpid(), 30))
+
+
+def record_lookups(hits):
+    for _ in range(hits):
+        metrics.cache_lookup("highlight", True)
+    metrics.registry.flush()
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.tmp.name, "cache.sqlite3")
+        self.cache = make_cache(self.location)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_set_delete(self):
+        self.cache.set("key", {"a": [1, 2]})
+        self.assertEqual(self.cache.get("key"), {"a": [1, 2]})
+        self.assertTrue(self.cache.delete("key"))
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_expiry(self):
+        self.cache.set("key", 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.add("key", 2))
+        self.assertEqual(self.cache.get("key"), 2)
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add("key", 1))
+        self.assertFalse(self.cache.add("key", 5))
+        self.assertEqual(self.cache.incr("key", 4), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_lru_eviction(self):
+        cache = make_cache(self.location, MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.CULL_EVERY = 1
+        cache.ACCESS_RESOLUTION = 0
+        for i in range(10):
+            cache.set(f"key{i}", i)
+        cache.get("key0")
+        cache.set("key10", 10)
+        self.assertEqual(cache.get("key0"), 0)
+        self.assertIsNone(cache.get("key1"))
+        self.assertEqual(cache.get("key10"), 10)
+
+    def test_size_bound(self):
+        cache = make_cache(self.location, MAX_SIZE=10_000)
+        cache.CULL_EVERY = 1
+        for i in range(20):
+            cache.set(f"key{i}", "x" * 1000)
+        count, size = cache._usage(cache.connection)
+        self.assertLessEqual(size, 10_000)
+        self.assertEqual(cache.get("key19"), "x" * 1000)
+
+    def test_shared_across_processes(self):
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 200)
+
+    def test_add_has_one_winner_across_processes(self):
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [
+            context.Process(target=try_add, args=(self.location, results))
+            for _ in range(6)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(results.get() for _ in workers), [False] * 5 + [True])
+
+
+@override_settings(SLOW_REQUEST_MS=60_000)
+class RequestTimingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username="alice", password="pass")
+        self.client.post("/api/auth/login/", {"username": "alice", "password": "pass"})
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        response = self.client.get("/api/docs/documents/")
+        metrics = {
+            part.split(";")[0]: part
+            for part in response.headers["Server-Timing"].split(", ")
+        }
+        self.assertEqual(set(metrics), {"db", "auth", "view", "render", "total"})
+        self.assertRegex(metrics["db"], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+
+    @override_settings(SERVER_TIMING=False, SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs("config.requests", "WARNING") as logs:
+            response = self.client.get("/api/auth/me/")
+        self.assertNotIn("Server-Timing", response.headers)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/auth/me/")
+        self.assertEqual(record["status"], 200)
+        self.assertIn("auth_ms", record)
+        self.assertIsInstance(record["repeated_sql"], list)
+
+    @override_settings(SERVER_TIMING=True, ROOT_URLCONF="config.urls_async")
+    def test_async_view_queries_counted(self):
+        self.async_client.cookies = self.client.cookies
+        response = async_to_sync(self.async_client.get)("/api/docs/documents/")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries"'
+        )
+        self.assertIn("auth;dur=", response["Server-Timing"])
+
+    def test_repeated_sql(self):
+        state = RequestTiming()
+        with connection.execute_wrapper(state.execute_wrapper):
+            for ids in ([1], [1, 2], [1, 2, 3]):
+                list(User.objects.filter(id__in=ids))
+            User.objects.count()
+        self.assertEqual(state.queries, 4)
+        repeated = state.repeated_sql()
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0]["count"], 3)
+        self.assertIn("IN (...)", repeated[0]["sql"])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        overrides = override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=self.tmp.name, SLOW_REQUEST_MS=60_000
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        cache.clear()
+        User.objects.create_user(username="admin", password="pass", role="admin")
+        User.objects.create_user(username="alice", password="pass")
+
+    def login(self, username):
+        self.client.post("/api/auth/login/", {"username": username, "password": "pass"})
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+        self.login("alice")
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+
+    def test_request_metrics(self):
+        self.login("admin")
+        self.client.get("/api/docs/documents/")
+        self.client.get("/api/docs/documents/")
+        self.client.get("/api/docs/documents/missing/")
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn(
+            'http_requests_total{method="GET",route="document-list",status="200"} 2',
+            text,
+        )
+        self.assertIn(
+            'http_requests_total{method="GET",route="document-detail",status="404"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_requests_total{method="POST",route="accounts:login",status="200"} 1',
+            text,
+        )
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{method="GET",route="document-list",'
+            'le="+Inf"} 2',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="document-list"} 2',
+            text,
+        )
+        self.assertIn('http_request_db_queries_count{route="document-list"} 2', text)
+        self.assertIn('cache_lookups_total{cache="token_version",result="miss"}', text)
+
+    def test_aggregated_across_processes(self):
+        metrics.cache_lookup("highlight", False)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=record_lookups, args=(3,)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        text = metrics.render()
+        self.assertEqual(len(os.listdir(self.tmp.name)), 3)
+        self.assertIn('cache_lookups_total{cache="highlight",result="hit"} 6', text)
+        self.assertIn('cache_lookups_total{cache="highlight",result="miss"} 1', text)
+        self.assertIn('cache_hit_ratio{cache="highlight"} 0.8571428571428571', text)
+
+
+@override_settings(REPLICA_DATABASES=["replica"], REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingTest(TestCase):
+    """
+    The "replica" test database stands in for a replica that hasn't caught
+    up: same rows, but titles and content that say where they came from.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        for user in (self.admin, self.reader):
+            user.save(using="replica")
+        for using, where in (("default", "Primary"), ("replica", "Replica")):
+            document = Document.objects.using(using).create(
+                pk=1, title=where, slug="doc", author=self.admin, is_published=True
+            )
+            DocumentBlock.objects.using(using).create(
+                pk=1, document=document, block_type="text", content=where
+            )
+
+    def login(self, username):
+        self.client.post("/api/auth/login/", {"username": username, "password": "pass"})
+        # Logging in is a write too
+        self.client.cookies.pop(replicas.PIN_COOKIE, None)
+
+    def titles(self):
+        return {
+            "list": self.client.get("/api/docs/documents/").json()["results"][0][
+                "title"
+            ],
+            "detail": self.client.get("/api/docs/documents/doc/").json()["title"],
+            "blocks": self.client.get("/api/docs/documents/1/blocks/").json()[0][
+                "content"
+            ],
+        }
+
+    def test_reads_go_to_replica(self):
+        self.login("reader")
+        self.assertEqual(
+            self.titles(),
+            {"list": "Replica", "detail": "Replica", "blocks": "Replica"},
+        )
+        stream = self.client.get("/api/docs/documents/doc/?stream=1")
+        lines = b"".join(stream.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[-1])["content"], "Replica")
+
+    def test_like_is_written_to_primary_and_pins(self):
+        self.login("reader")
+        response = self.client.post("/api/docs/documents/doc/like/")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Like.objects.using("default").exists())
+        self.assertFalse(Like.objects.using("replica").exists())
+
+        pin = response.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(pin["max-age"], 30)
+        self.assertTrue(pin["httponly"])
+        like = self.client.get("/api/docs/documents/doc/like/").json()
+        self.assertEqual(like, {"is_liked": True, "likes_count": 1})
+        self.assertEqual(self.titles()["detail"], "Primary")
+
+        # Once the pin expires, reads are back on the replica
+        del self.client.cookies[replicas.PIN_COOKIE]
+        like = self.client.get("/api/docs/documents/doc/like/").json()
+        self.assertEqual(like, {"is_liked": False, "likes_count": 0})
+
+    def test_block_save_pins_admin(self):
+        self.login("admin")
+        response = self.client.put(
+            "/api/docs/documents/1/blocks/1/",
+            {"block_type": "text", "content": "Saved", "order": 0},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            DocumentBlock.objects.using("replica").get().content, "Replica"
+        )
+        self.assertEqual(self.titles()["blocks"], "Saved")
+
+    def test_failed_write_does_not_pin(self):
+        self.login("reader")
+        response = self.client.delete("/api/docs/documents/doc/")
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(ROOT_URLCONF="config.urls_async")
+    def test_async_views(self):
+        self.login("reader")
+        self.async_client.cookies = self.client.cookies
+        response = async_to_sync(self.async_client.get)("/api/docs/documents/doc/")
+        self.assertEqual(response.json()["title"], "Replica")
+
+    def test_only_content_is_replicated(self):
+        routing = replicas.Routing()
+        routing.replica = "replica"
+        token = replicas.activate(routing)
+        try:
+            self.assertEqual(router.db_for_read(Document), "replica")
+            self.assertEqual(router.db_for_read(User), "default")
+            self.assertEqual(router.db_for_write(Document), "default")
+        finally:
+            replicas.deactivate(token)
+        self.assertEqual(router.db_for_read(Document), "default")
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        self.login("reader")
+        self.assertEqual(self.titles()["list"], "Primary")
+        response = self.client.post("/api/docs/documents/doc/like/")
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
@@ -0,0 +1,99 @@
+# config/timing.py
+
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Collapses IN (%s, %s, ...) so the same statement with different list
+# lengths is counted as one
+PLACEHOLDER_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+_current = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """
+    Durations (seconds) and SQL statements recorded while one request is
+    handled. RequestTimingMiddleware installs it for the request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = defaultdict(float)
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def add(self, name, duration):
+        self.spans[name] += duration
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += duration
+            statement = self.statements[PLACEHOLDER_LIST_RE.sub("(...)", sql)]
+            statement[0] += 1
+            statement[1] += duration
+
+    def repeated_sql(self, limit=5):
+        """The statements run more than once, most frequent first."""
+        repeated = [
+            {"sql": sql, "count": count, "ms": round(duration * 1000, 2)}
+            for sql, (count, duration) in self.statements.items()
+            if count > 1
+        ]
+        repeated.sort(key=lambda item: (-item["count"], -item["ms"]))
+        return repeated[:limit]
+
+
+def current():
+    return _current.get()
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing.execute_wrapper(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    """
+    Add execute_wrapper to `connection` for good. Connections are per
+    thread and async ORM calls run on other threads than the middleware,
+    so the wrapper finds the request through the context variable, which
+    asgiref carries across.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def activate(timing):
+    return _current.set(timing)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Add the time spent in the block to the current request's `name` span;
+    a no-op outside a request.
+    """
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
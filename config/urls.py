@@ -3,9 +3,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("accounts.urls")),
     path("api/docs/", include("docs.urls")),
+    path("api/metrics/", metrics_view, name="metrics"),
     path("", include("frontend.urls")),
 ]
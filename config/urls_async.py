@@ -0,0 +1,23 @@
+# config/urls_async.py
+
+from django.urls import path, re_path
+
+from accounts.async_views import me_view
+from docs.async_views import block_list, document_detail, document_list
+
+from .urls import urlpatterns as sync_urlpatterns
+
+# Used by config/asgi.py. The read paths below are async views; every other
+# URL, and every write to these ones, is served as in config.urls.
+urlpatterns = [
+    path("api/auth/me/", me_view, name="me"),
+    path("api/docs/documents/", document_list, name="document-list"),
+    # "reorder" is the list route action, not a document
+    re_path(
+        r"^api/docs/documents/(?!reorder/)(?P<slug>[^/.]+)/$",
+        document_detail,
+        name="document-detail",
+    ),
+    path("api/docs/documents/<int:document_pk>/blocks/", block_list),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,16 @@
+# config/views.py
+
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+
+from docs.permissions import IsAdminUser
+
+from . import metrics
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DocsConfig(AppConfig):
     name = "docs"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,142 @@
+# docs/async_views.py
+
+from django.db.models import aprefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+
+from config.async_views import async_api_view, json_response
+from config.replicas import replica_reads
+
+from . import fieldsets
+from .cache import aget_or_build, document_payload_key
+from .conditional import add_validators, make_etag, not_modified
+from .pagination import KeysetPagination
+from .serializers import (
+    DocumentBlockSerializer,
+    DocumentHeaderSerializer,
+    DocumentListSerializer,
+    DocumentSerializer,
+)
+from .views import (
+    STREAM_CHUNK_SIZE,
+    DocumentBlockViewSet,
+    DocumentViewSet,
+    PER_REQUEST_FIELDS,
+    detail_queryset,
+    document_etag,
+    document_last_modified,
+    list_queryset,
+    ndjson,
+    page_etag,
+    per_request_data,
+    visible_blocks,
+    visible_documents,
+    window_blocks,
+)
+
+
+@replica_reads
+@async_api_view(
+    DocumentViewSet.as_view(
+        {"get": "list", "post": "create"}, basename="document", detail=False
+    )
+)
+async def document_list(request):
+    fields = fieldsets.requested_fields(request.query_params, DocumentListSerializer)
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(
+        list_queryset(request.user, fields), request
+    )
+    etag = page_etag(request, page, fields)
+    response = not_modified(request, etag)
+    if response is None:
+        serializer = DocumentListSerializer(page, many=True, fields=fields)
+        response = json_response(paginator.get_paginated_response(serializer.data).data)
+    return add_validators(response, etag)
+
+
+@replica_reads
+@async_api_view(
+    DocumentViewSet.as_view(
+        {
+            "get": "retrieve",
+            "put": "update",
+            "patch": "partial_update",
+            "delete": "destroy",
+        },
+        basename="document",
+        detail=True,
+    )
+)
+async def document_detail(request, slug):
+    fields = fieldsets.requested_fields(request.query_params, DocumentSerializer)
+    document = await aget_object_or_404(
+        detail_queryset(request.user, fields), slug=slug
+    )
+    stream = request.query_params.get("stream") == "1"
+    etag = document_etag(document, stream, fields)
+    last_modified = document_last_modified(document, fields)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    if stream:
+        response = StreamingHttpResponse(
+            stream_document(request, document, fields),
+            content_type="application/x-ndjson",
+        )
+        return add_validators(response, etag, last_modified)
+
+    async def build():
+        if "blocks" in fields:
+            await aprefetch_related_objects([document], "blocks")
+        serializer = DocumentSerializer(
+            document, context={"request": request}, fields=fields
+        )
+        data = dict(serializer.data)
+        for name in PER_REQUEST_FIELDS:
+            data.pop(name, None)
+        return data
+
+    data = await aget_or_build(
+        document_payload_key(document, fields), build, name="document"
+    )
+    response = json_response({**data, **per_request_data(document, fields)})
+    return add_validators(response, etag, last_modified)
+
+
+async def stream_document(request, document, fields):
+    header = DocumentHeaderSerializer(
+        document, context={"request": request}, fields=fields
+    )
+    yield ndjson({"type": "document", **header.data})
+    if "blocks" not in fields:
+        return
+
+    blocks = document.blocks.order_by("order", "id")
+    async for block in blocks.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield ndjson({"type": "block", **DocumentBlockSerializer(block).data})
+
+
+@replica_reads
+@async_api_view(DocumentBlockViewSet.as_view({"get": "list", "post": "create"}))
+async def block_list(request, document_pk):
+    updated_at = (
+        await visible_documents(request.user)
+        .filter(pk=document_pk)
+        .values_list("updated_at", flat=True)
+        .afirst()
+    )
+    queryset = window_blocks(
+        visible_blocks(request.user, document_pk), request.query_params
+    )
+    if updated_at is None:
+        blocks = [block async for block in queryset]
+        return json_response(DocumentBlockSerializer(blocks, many=True).data)
+
+    # Block changes touch the document, so its updated_at versions them.
+    etag = make_etag(document_pk, updated_at, request.get_full_path())
+    response = not_modified(request, etag, updated_at)
+    if response is None:
+        blocks = [block async for block in queryset]
+        response = json_response(DocumentBlockSerializer(blocks, many=True).data)
+    return add_validators(response, etag, updated_at)
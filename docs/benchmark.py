@@ -0,0 +1,338 @@
+# docs/benchmark.py
+
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .management.commands.seed_docs import DOCUMENT_PREFIX, PASSWORD, USER_PREFIX
+from .models import Document, DocumentBlock
+
+User = get_user_model()
+
+
+def parse_size(size):
+    """'100x20x5x50' -> documents, blocks, likes, users"""
+    documents, blocks, likes, users = (int(part) for part in size.split("x"))
+    return {"documents": documents, "blocks": blocks, "likes": likes, "users": users}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(round(fraction * (len(ordered) - 1)), len(ordered) - 1)]
+
+
+def body_size(response):
+    if response.streaming:
+        return len(b"".join(response.streaming_content))
+    return len(response.content)
+
+
+def login(username):
+    client = APIClient()
+    response = client.post(
+        "/api/auth/login/", {"username": username, "password": PASSWORD}
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Login as {username} failed: {response.content!r}")
+    return client
+
+
+class Bench:
+    """
+    Runs every docs and accounts endpoint against seeded data through the
+    test client, with real cookie JWT authentication.
+    """
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.throwaways = 0
+        self.admin_user = User.objects.get(username=f"{USER_PREFIX}admin")
+        self.admin = login(f"{USER_PREFIX}admin")
+        self.reader = login(f"{USER_PREFIX}user-0")
+        document = (
+            Document.objects.filter(is_published=True, slug__startswith=DOCUMENT_PREFIX)
+            .order_by("order")
+            .first()
+        )
+        self.document_id = document.pk
+        self.doc = f"/api/docs/documents/{document.pk}"
+        self.detail = f"/api/docs/documents/{document.slug}"
+        self.blocks = list(
+            DocumentBlock.objects.filter(document=document)
+            .order_by("order", "id")
+            .values("id", "block_type", "content", "language", "order")
+        )
+        page = self.reader.get("/api/docs/documents/?page_size=10").json()
+        self.next_page = page["next"] or "/api/docs/documents/?page_size=10"
+
+    def throwaway_document(self):
+        """Setup for documents.destroy: a fresh document to delete."""
+        self.throwaways += 1
+        self.throwaway = Document.objects.create(
+            title=f"Throwaway {self.throwaways}", author=self.admin_user
+        )
+        return self.admin
+
+    def throwaway_block(self):
+        """Setup for blocks.destroy: a fresh block to delete."""
+        self.throwaway = DocumentBlock.objects.create(
+            document_id=self.document_id, block_type="text", content="throwaway"
+        )
+        return self.admin
+
+    def endpoints(self):
+        """
+        (name, client, method, url or url(), data or data(i), setup or None)
+
+        setup() returns the client to use and runs before url() is called,
+        so it can make the row a destructive call removes.
+        """
+        blocks, first = self.blocks, self.blocks[0] if self.blocks else None
+        return [
+            ("documents.list", self.reader, "get", "/api/docs/documents/", None, None),
+            ("documents.list.page", self.reader, "get", self.next_page, None, None),
+            (
+                "documents.list.admin",
+                self.admin,
+                "get",
+                "/api/docs/documents/",
+                None,
+                None,
+            ),
+            ("documents.detail", self.reader, "get", f"{self.detail}/", None, None),
+            (
+                "documents.detail.stream",
+                self.reader,
+                "get",
+                f"{self.detail}/?stream=1",
+                None,
+                None,
+            ),
+            (
+                "documents.like.get",
+                self.reader,
+                "get",
+                f"{self.detail}/like/",
+                None,
+                None,
+            ),
+            (
+                "documents.like.toggle",
+                self.reader,
+                "post",
+                f"{self.detail}/like/",
+                None,
+                None,
+            ),
+            (
+                "documents.update",
+                self.admin,
+                "patch",
+                f"{self.detail}/",
+                lambda i: {"title": f"Seed document 0 ({i})"},
+                None,
+            ),
+            (
+                "documents.reorder",
+                self.admin,
+                "patch",
+                "/api/docs/documents/reorder/",
+                lambda i: {"items": [{"id": self.document_id, "order": i}]},
+                None,
+            ),
+            ("blocks.list", self.admin, "get", f"{self.doc}/blocks/", None, None),
+            (
+                "blocks.window",
+                self.reader,
+                "get",
+                f"{self.doc}/blocks/?after_order=0&limit=10",
+                None,
+                None,
+            ),
+            (
+                "blocks.reorder",
+                self.admin,
+                "patch",
+                f"{self.doc}/blocks/reorder/",
+                lambda i: {
+                    "items": [
+                        {"id": block["id"], "order": block["order"] + i}
+                        for block in blocks
+                    ]
+                },
+                None,
+            ),
+            (
+                "blocks.bulk",
+                self.admin,
+                "post",
+                f"{self.doc}/blocks/bulk/",
+                lambda i: {
+                    "blocks": [
+                        {**block, "content": f"{block['content']} {i}"}
+                        for block in blocks
+                    ]
+                },
+                None,
+            ),
+            (
+                "blocks.update",
+                self.admin,
+                "put",
+                f"{self.doc}/blocks/{first['id']}/" if first else "",
+                lambda i: {**first, "content": f"edited {i}"} if first else {},
+                None,
+            ),
+            (
+                "blocks.retrieve",
+                self.reader,
+                "get",
+                f"{self.doc}/blocks/{first['id']}/" if first else "",
+                None,
+                None,
+            ),
+            (
+                "blocks.create",
+                self.admin,
+                "post",
+                f"{self.doc}/blocks/",
+                lambda i: {"block_type": "text", "content": f"new {i}", "order": i},
+                None,
+            ),
+            (
+                "blocks.destroy",
+                None,
+                "delete",
+                lambda: f"{self.doc}/blocks/{self.throwaway.pk}/",
+                None,
+                self.throwaway_block,
+            ),
+            (
+                "documents.create",
+                self.admin,
+                "post",
+                "/api/docs/documents/",
+                lambda i: {"title": f"Benchmark document {i}"},
+                None,
+            ),
+            (
+                "documents.destroy",
+                None,
+                "delete",
+                lambda: f"/api/docs/documents/{self.throwaway.slug}/",
+                None,
+                self.throwaway_document,
+            ),
+            ("search", self.reader, "get", "/api/docs/search/?q=lorem", None, None),
+            (
+                "auth.register",
+                APIClient(),
+                "post",
+                "/api/auth/register/",
+                lambda i: {"username": f"{USER_PREFIX}new-{i}", "password": PASSWORD},
+                None,
+            ),
+            (
+                "auth.login",
+                APIClient(),
+                "post",
+                "/api/auth/login/",
+                {"username": f"{USER_PREFIX}user-1", "password": PASSWORD},
+                None,
+            ),
+            ("auth.me", self.reader, "get", "/api/auth/me/", None, None),
+            ("auth.refresh", self.reader, "post", "/api/auth/refresh/", None, None),
+            (
+                "auth.logout",
+                None,
+                "post",
+                "/api/auth/logout/",
+                None,
+                lambda: login(f"{USER_PREFIX}user-2"),
+            ),
+        ]
+
+    def measure(self, client, method, url, data, setup):
+        timings, queries, size = [], 0, 0
+        # One untimed warm-up call, then `repeat` timed ones
+        for i in range(self.repeat + 1):
+            if setup is not None:
+                client = setup()
+            path = url() if callable(url) else url
+            payload = data(i) if callable(data) else data
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, payload, format="json")
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method.upper()} {path}: {response.status_code}")
+            if i:
+                timings.append(elapsed * 1000)
+                queries = max(queries, len(captured))
+                size = max(size, body_size(response))
+        return {
+            "queries": queries,
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "bytes": size,
+        }
+
+    def run(self):
+        results = {}
+        for name, client, method, url, data, setup in self.endpoints():
+            if not url:
+                continue
+            results[name] = self.measure(client, method, url, data, setup)
+        return results
+
+
+def reset():
+    Document.objects.all().delete()
+    User.objects.all().delete()
+    cache.clear()
+
+
+def run(sizes, repeat=20):
+    """
+    Seed each size in turn and benchmark every endpoint against it.
+    Returns {size: {endpoint: {queries, p50_ms, p95_ms, bytes}}}.
+    Deletes every document and user in the current database.
+    """
+    results = {}
+    for size in sizes:
+        reset()
+        call_command("seed_docs", **parse_size(size), stdout=StringIO())
+        results[size] = Bench(repeat).run()
+    reset()
+    return results
+
+
+def compare(results, baseline, latency_threshold=0.5, latency_slack_ms=2.0):
+    """
+    Regressions against `baseline`: any extra query, or a p95 above
+    baseline * (1 + latency_threshold) + latency_slack_ms.
+    """
+    failures = []
+    for size, endpoints in baseline.items():
+        for name, expected in endpoints.items():
+            actual = results.get(size, {}).get(name)
+            if actual is None:
+                continue
+            if actual["queries"] > expected["queries"]:
+                failures.append(
+                    f"{size} {name}: {actual['queries']} queries "
+                    f"(baseline {expected['queries']})"
+                )
+            limit = expected["p95_ms"] * (1 + latency_threshold) + latency_slack_ms
+            if actual["p95_ms"] > limit:
+                failures.append(
+                    f"{size} {name}: p95 {actual['p95_ms']:.1f}ms "
+                    f"(baseline {expected['p95_ms']:.1f}ms, limit {limit:.1f}ms)"
+                )
+    return failures
@@ -0,0 +1,123 @@
+# docs/cache.py
+
+import asyncio
+import threading
+import time
+import weakref
+
+from django.core.cache import cache
+
+from config import metrics
+
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+def document_version(document):
+    """
+    updated_at is bumped by every document save and every block change
+    (see DocumentQuerySet.touch), so it doubles as the content version.
+    """
+    return f"{document.pk}:{document.updated_at.timestamp():.6f}"
+
+
+def document_payload_key(document, fields):
+    return f"docs:document:{document_version(document)}:{','.join(fields)}"
+
+
+class _Flight:
+    __slots__ = ("lock", "__weakref__")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+_flights = weakref.WeakValueDictionary()
+_flights_guard = threading.Lock()
+
+
+def get_or_build(key, build, timeout=PAYLOAD_TIMEOUT, name="payload"):
+    """
+    Return the cached value for `key`, calling `build()` on a miss.
+
+    Concurrent misses share one rebuild: threads in this process wait on a
+    local lock, other processes wait on a lock key in the cache and poll
+    for the result. Hits and misses are counted in metrics as `name`.
+    """
+    value = cache.get(key)
+    metrics.cache_lookup(name, value is not None)
+    if value is not None:
+        return value
+
+    with _flights_guard:
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = _Flight()
+
+    with flight.lock:
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                value = build()
+                cache.set(key, value, timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+
+        # The other builder died or is stuck; don't wait forever.
+        value = build()
+        cache.set(key, value, timeout)
+        return value
+
+
+_async_flights = weakref.WeakValueDictionary()
+
+
+async def aget_or_build(key, build, timeout=PAYLOAD_TIMEOUT, name="payload"):
+    """get_or_build() for async views; `build` is a coroutine function."""
+    value = await cache.aget(key)
+    metrics.cache_lookup(name, value is not None)
+    if value is not None:
+        return value
+
+    # Tasks of one event loop never run at the same time, so no guard
+    lock = _async_flights.get(key)
+    if lock is None:
+        lock = _async_flights[key] = asyncio.Lock()
+
+    async with lock:
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+
+        lock_key = f"{key}:lock"
+        if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                value = await build()
+                await cache.aset(key, value, timeout)
+            finally:
+                await cache.adelete(lock_key)
+            return value
+
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+
+        value = await build()
+        await cache.aset(key, value, timeout)
+        return value
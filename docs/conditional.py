@@ -0,0 +1,36 @@
+# docs/conditional.py
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def add_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    # Responses depend on the user's cookies, so only the browser may keep
+    # them and it has to revalidate every time.
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Return a 304 response when the request's If-None-Match or
+    If-Modified-Since matches, otherwise None.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
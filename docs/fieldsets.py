@@ -0,0 +1,66 @@
+# docs/fieldsets.py
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+# Loaded whatever is asked for: pagination keys on them and the response
+# validators and payload cache key are built from them
+ALWAYS_LOADED = ("id", "order", "created_at", "updated_at")
+
+
+def split(value):
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def requested_fields(params, serializer_class):
+    """
+    The fields of `serializer_class` a request asks for, in Meta.fields
+    order:
+
+    ?fields=id,title   only these
+    ?include=blocks    the defaults and these
+    ?exclude=blocks    the defaults without these
+
+    The defaults are the serializer's DEFAULT_FIELDS, or all of Meta.fields.
+    """
+    available = serializer_class.Meta.fields
+    if "fields" in params:
+        fields = split(params["fields"])
+    else:
+        fields = set(getattr(serializer_class, "DEFAULT_FIELDS", available))
+    include = split(params.get("include", ""))
+    exclude = split(params.get("exclude", ""))
+
+    unknown = (fields | include | exclude) - set(available)
+    if unknown:
+        raise ValidationError({"fields": f"Unknown fields: {sorted(unknown)}"})
+    fields = (fields | include) - exclude
+    return tuple(name for name in available if name in fields)
+
+
+def narrow(queryset, serializer_class, fields):
+    """
+    `queryset` loading only the columns `fields` are serialized from, plus
+    ALWAYS_LOADED. Fields of related rows (author.username) join them in.
+
+    Nested serializers (blocks) are left to the caller, which knows whether
+    a cached payload makes them unnecessary, and method fields to the
+    annotations the view adds.
+    """
+    serializer = serializer_class(fields=fields)
+    columns = {field.name for field in queryset.model._meta.concrete_fields}
+    only = set(ALWAYS_LOADED)
+    related = set()
+    for name in fields:
+        field = serializer.fields[name]
+        source = field.source.replace(".", "__")
+        if isinstance(field, serializers.ListSerializer):
+            continue
+        if source in columns:
+            only.add(source)
+        elif "__" in source:
+            only.add(source)
+            related.add(source.split("__")[0])
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(only))
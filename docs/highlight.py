@@ -0,0 +1,73 @@
+# docs/highlight.py
+
+import hashlib
+
+from django.core.cache import cache
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.lexers.special import TextLexer
+from pygments.util import ClassNotFound
+
+from config import metrics
+
+# Part of every hash, so changing the formatter re-renders stored blocks
+# (see the highlight_blocks command)
+HIGHLIGHT_VERSION = 1
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# Only the token <span>s; CodeBlock.jsx supplies the <pre><code> wrapper
+FORMATTER = HtmlFormatter(nowrap=True)
+
+
+def highlight_hash(content, language):
+    data = f"{HIGHLIGHT_VERSION}\0{language}\0{content}"
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def render(content, language):
+    try:
+        lexer = get_lexer_by_name(language or "text", stripnl=False)
+    except ClassNotFound:
+        lexer = TextLexer(stripnl=False)
+    # Pygments always ends the output with a newline
+    return highlight(content, lexer, FORMATTER).removesuffix("\n")
+
+
+def render_cached(content, language, digest):
+    key = f"highlight:{digest}"
+    html = cache.get(key)
+    metrics.cache_lookup("highlight", html is not None)
+    if html is None:
+        html = render(content, language)
+        cache.set(key, html, CACHE_TIMEOUT)
+    return html
+
+
+def apply(block):
+    """
+    Bring block.highlighted_html up to date with its content and language.
+    Returns True if anything changed.
+    """
+    if block.block_type != "code":
+        changed = bool(block.highlight_hash or block.highlighted_html)
+        block.highlight_hash = block.highlighted_html = ""
+        return changed
+
+    digest = highlight_hash(block.content, block.language)
+    if digest == block.highlight_hash:
+        return False
+    block.highlighted_html = render_cached(block.content, block.language, digest)
+    block.highlight_hash = digest
+    return True
+
+
+def render_rows(rows):
+    """
+    [(pk, digest, content, language), ...] -> [(pk, digest, html), ...].
+    Used by highlight_blocks in worker processes; no database access.
+    """
+    return [
+        (pk, digest, render(content, language))
+        for pk, digest, content, language in rows
+    ]
@@ -0,0 +1,169 @@
+# docs/loadgen.py
+
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+
+from .benchmark import percentile
+
+# Requests arrive as they would through the TLS-terminating proxy, so
+# SECURE_SSL_REDIRECT doesn't answer every one of them with a redirect
+PROXY_HEADERS = ("X-Forwarded-Proto: https",)
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection, opened on first use."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=(), body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(body)}",
+            *PROXY_HEADERS,
+            *headers,
+        ]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status, response_headers, response_body = await self.read_response(method)
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, response_body
+
+    async def read_response(self, method):
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *lines = head.decode("latin-1").split("\r\n")[:-2]
+        status = int(status_line.split()[1])
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            name = name.strip().lower()
+            # Only Set-Cookie repeats in our responses
+            if name in headers:
+                headers[name] += "\n" + value.strip()
+            else:
+                headers[name] = value.strip()
+
+        if method == "HEAD" or status in (204, 304):
+            return status, headers, b""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+            return status, headers, bytes(body)
+        length = int(headers.get("content-length", 0))
+        return status, headers, await self.reader.readexactly(length)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+async def login(host, port, username, password):
+    """The Cookie header of a fresh session for `username`."""
+    connection = Connection(host, port)
+    body = json.dumps({"username": username, "password": password}).encode()
+    try:
+        status, headers, content = await connection.request(
+            "POST", "/api/auth/login/", ["Content-Type: application/json"], body
+        )
+    finally:
+        await connection.close()
+    if status != 200:
+        raise RuntimeError(f"Login as {username} failed: {status} {content!r}")
+    cookies = SimpleCookie()
+    for header in headers.get("set-cookie", "").split("\n"):
+        cookies.load(header)
+    return "Cookie: " + "; ".join(
+        f"{name}={morsel.value}" for name, morsel in cookies.items()
+    )
+
+
+async def client(host, port, paths, headers, deadline, samples, errors):
+    connection = Connection(host, port)
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status, _, _ = await connection.request("GET", path, headers)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            errors.append(path)
+            await connection.close()
+            continue
+        if status >= 400:
+            errors.append(path)
+        else:
+            samples.append((time.perf_counter() - start) * 1000)
+    await connection.close()
+
+
+async def slow_client(host, port, deadline):
+    """
+    A client on a poor network: it sends its request a header at a time and
+    never finishes it.
+    """
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except ConnectionError:
+        return
+    try:
+        writer.write(f"GET / HTTP/1.1\r\nHost: {host}:{port}\r\n".encode())
+        i = 0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(1)
+            writer.write(f"X-Slow-{i}: 1\r\n".encode())
+            await writer.drain()
+            i += 1
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run(host, port, paths, cookie, connections, duration, slow=0):
+    """
+    Keep `connections` keep-alive connections sending GETs for `paths` in
+    turn for `duration` seconds, while `slow` more connections trickle in a
+    request that never completes. Returns requests, errors, rps, p50_ms
+    and p95_ms.
+    """
+    deadline = time.monotonic() + duration
+    samples, errors = [], []
+    headers = [cookie, "Accept: application/json"]
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(slow_client(host, port, deadline) for _ in range(slow)),
+        *(
+            client(host, port, paths, headers, deadline, samples, errors)
+            for _ in range(connections)
+        ),
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 0.5), 2) if samples else None,
+        "p95_ms": round(percentile(samples, 0.95), 2) if samples else None,
+    }
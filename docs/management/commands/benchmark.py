@@ -0,0 +1,111 @@
+# docs/management/commands/benchmark.py
+
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from docs import benchmark
+
+BASELINE = Path(__file__).resolve().parents[2] / "benchmark_baseline.json"
+DEFAULT_SIZES = "10x10x2x10,100x20x5x50,1000x20x5x100"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at several sizes (documents x blocks x "
+        "likes x users), run every API endpoint through the test client and "
+        "compare query counts and p95 latency with the checked-in baseline. "
+        "Query counts are portable; p95s are only comparable on the machine "
+        "that wrote the baseline, so regenerate it with --write-baseline "
+        "before comparing elsewhere or widen --latency-threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=DEFAULT_SIZES)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--baseline", type=Path, default=BASELINE)
+        parser.add_argument(
+            "--write-baseline",
+            action="store_true",
+            help="Store these results as the new baseline instead of comparing",
+        )
+        parser.add_argument(
+            "--latency-threshold",
+            type=float,
+            default=0.5,
+            help="Allowed p95 slowdown as a fraction of the baseline",
+        )
+        parser.add_argument(
+            "--latency-slack",
+            type=float,
+            default=2.0,
+            help="Allowed p95 slowdown in milliseconds on top of the fraction",
+        )
+
+    def handle(self, *args, sizes, repeat, baseline, **options):
+        sizes = [size.strip() for size in sizes.split(",") if size.strip()]
+        try:
+            for size in sizes:
+                benchmark.parse_size(size)
+        except ValueError:
+            raise CommandError("Sizes look like 100x20x5x50 (N x M x K x U).")
+
+        results = self.run(sizes, repeat)
+        self.report(results)
+
+        if options["write_baseline"]:
+            baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {baseline}"))
+            return
+
+        if not baseline.exists():
+            raise CommandError(f"No baseline at {baseline}; use --write-baseline.")
+        failures = benchmark.compare(
+            results,
+            json.loads(baseline.read_text()),
+            latency_threshold=options["latency_threshold"],
+            latency_slack_ms=options["latency_slack"],
+        )
+        if failures:
+            raise CommandError("Regressions:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run(self, sizes, repeat):
+        # Neither the database nor the cache may be the real ones: the run
+        # deletes every user and document it finds.
+        with tempfile.TemporaryDirectory() as tmp:
+            caches = {
+                "default": {
+                    "BACKEND": "config.cache.SQLiteCache",
+                    "LOCATION": str(Path(tmp) / "cache.sqlite3"),
+                }
+            }
+            with override_settings(
+                CACHES=caches,
+                ALLOWED_HOSTS=["testserver"],
+                SECURE_SSL_REDIRECT=False,
+                PRERENDER_ENABLED=False,
+                # Login and register run far more often than their budgets
+                RATELIMIT_ENABLED=False,
+            ):
+                old_name = connection.creation.create_test_db(verbosity=0)
+                try:
+                    return benchmark.run(sizes, repeat)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def report(self, results):
+        for size, endpoints in results.items():
+            self.stdout.write(f"\n{size} (documents x blocks x likes x users)")
+            self.stdout.write(
+                f"  {'endpoint':<26}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>10}"
+            )
+            for name, result in endpoints.items():
+                self.stdout.write(
+                    f"  {name:<26}{result['queries']:>8}{result['p50_ms']:>10.2f}"
+                    f"{result['p95_ms']:>10.2f}{result['bytes']:>10}"
+                )
@@ -0,0 +1,176 @@
+# docs/management/commands/benchmark_servers.py
+
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from docs import loadgen
+from docs.management.commands.seed_docs import DOCUMENT_PREFIX, PASSWORD, USER_PREFIX
+from docs.models import Document
+
+STARTUP_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the app with gunicorn, first with threaded WSGI workers and "
+        "then with Uvicorn workers on config.asgi, and compare throughput "
+        "and latency as the number of concurrent keep-alive connections "
+        "grows. Runs against the configured database; fill it with "
+        "seed_docs first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", default="10,100,500")
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument(
+            "--threads", type=int, default=8, help="Threads per WSGI worker"
+        )
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=0,
+            help="Extra connections that send their request too slowly to finish",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--servers",
+            default="wsgi,asgi",
+            help="Which of wsgi and asgi to run",
+        )
+
+    def handle(self, *args, connections, duration, port, **options):
+        levels = [int(level) for level in connections.split(",") if level.strip()]
+        document = (
+            Document.objects.filter(is_published=True, slug__startswith=DOCUMENT_PREFIX)
+            .order_by("order")
+            .first()
+        )
+        if document is None:
+            raise CommandError("No seed documents; run seed_docs first.")
+        paths = [
+            "/api/docs/documents/",
+            f"/api/docs/documents/{document.slug}/",
+            f"/api/docs/documents/{document.pk}/blocks/",
+            "/api/auth/me/",
+        ]
+
+        servers = {
+            "wsgi": [
+                "config.wsgi:application",
+                "--worker-class",
+                "gthread",
+                "--threads",
+                str(options["threads"]),
+            ],
+            "asgi": [
+                "config.asgi:application",
+                "--worker-class",
+                "uvicorn_worker.UvicornWorker",
+            ],
+        }
+        names = [name.strip() for name in options["servers"].split(",")]
+        for name in names:
+            if name not in servers:
+                raise CommandError(f"Unknown server '{name}'.")
+        for module in ["gunicorn"] + (["uvicorn_worker"] if "asgi" in names else []):
+            if importlib.util.find_spec(module) is None:
+                raise CommandError(f"{module} isn't installed.")
+
+        results = {}
+        for name in names:
+            argv = servers[name] + ["--workers", str(options["workers"])]
+            with Server(argv, port):
+                cookie = asyncio.run(
+                    loadgen.login("127.0.0.1", port, f"{USER_PREFIX}user-0", PASSWORD)
+                )
+                for level in levels:
+                    self.stdout.write(f"{name}: {level} connections...")
+                    results[name, level] = asyncio.run(
+                        loadgen.run(
+                            "127.0.0.1",
+                            port,
+                            paths,
+                            cookie,
+                            level,
+                            duration,
+                            slow=options["slow_clients"],
+                        )
+                    )
+        self.report(names, levels, results)
+
+    def report(self, names, levels, results):
+        header = f"\n{'connections':>12}"
+        for name in names:
+            header += f"{name + ' rps':>12}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+        self.stdout.write(header)
+        for level in levels:
+            line = f"{level:>12}"
+            for name in names:
+                result = results[name, level]
+                line += (
+                    f"{result['rps']:>12}{result['p50_ms'] or '-':>9}"
+                    f"{result['p95_ms'] or '-':>9}{result['errors']:>8}"
+                )
+            self.stdout.write(line)
+
+
+class Server:
+    """gunicorn running in a child process while the block runs."""
+
+    def __init__(self, argv, port):
+        self.argv = argv
+        self.port = port
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        env = {
+            **os.environ,
+            "ALLOWED_HOSTS": "127.0.0.1",
+            "METRICS_DIR": self.tmp.name,
+            # Every request of a saturated server would be logged otherwise
+            "SLOW_REQUEST_MS": "1e9",
+        }
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                *self.argv,
+                "--bind",
+                f"127.0.0.1:{self.port}",
+                "--log-level",
+                "warning",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.tmp.cleanup()
+                raise CommandError("The server exited during startup.")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError("The server didn't start listening.")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.tmp.cleanup()
@@ -0,0 +1,94 @@
+# docs/management/commands/highlight_blocks.py
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from docs import highlight
+from docs.models import Document, DocumentBlock
+
+
+class Command(BaseCommand):
+    help = (
+        "Render highlighted_html for code blocks whose stored highlight is "
+        "missing or stale, spreading Pygments over worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, batch_size, workers, **options):
+        rendered = 0
+        if workers <= 1:
+            for batch in self.stale_batches(batch_size):
+                rendered += self.store(highlight.render_rows(batch))
+        else:
+            # Spawned workers don't inherit this process's database
+            # connection; they only import docs.highlight.
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=context) as executor:
+                # A bounded window of batches in flight keeps memory flat
+                pending = deque()
+                for batch in self.stale_batches(batch_size):
+                    pending.append(executor.submit(highlight.render_rows, batch))
+                    if len(pending) >= workers * 2:
+                        rendered += self.store(pending.popleft().result())
+                while pending:
+                    rendered += self.store(pending.popleft().result())
+
+        self.stdout.write(self.style.SUCCESS(f"Highlighted {rendered} code blocks."))
+
+    def stale_batches(self, batch_size):
+        blocks = (
+            DocumentBlock.objects.filter(block_type="code")
+            .order_by("pk")
+            .values_list("pk", "highlight_hash", "content", "language")
+        )
+        last_id = 0
+        while True:
+            rows = list(blocks.filter(pk__gt=last_id)[:batch_size])
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            batch = []
+            for pk, stored, content, language in rows:
+                digest = highlight.highlight_hash(content, language)
+                if digest != stored:
+                    batch.append((pk, digest, content, language))
+            if batch:
+                yield batch
+
+    def store(self, rows):
+        """
+        Write the rendered rows whose block still holds what they were
+        rendered from, and touch their documents so cached payloads,
+        validators and snapshots pick the highlight up.
+        """
+        rendered = {pk: (digest, html) for pk, digest, html in rows}
+        with transaction.atomic():
+            current = (
+                DocumentBlock.objects.select_for_update()
+                .filter(pk__in=rendered, block_type="code")
+                .values_list("pk", "document_id", "content", "language")
+            )
+            blocks, documents = [], set()
+            for pk, document_id, content, language in current:
+                digest, html = rendered[pk]
+                # Edited since it was read; its save() rendered it already
+                if highlight.highlight_hash(content, language) != digest:
+                    continue
+                blocks.append(
+                    DocumentBlock(pk=pk, highlight_hash=digest, highlighted_html=html)
+                )
+                documents.add(document_id)
+            DocumentBlock.objects.bulk_update(
+                blocks, ["highlight_hash", "highlighted_html"]
+            )
+            if documents:
+                Document.objects.filter(pk__in=documents).touch()
+        return len(blocks)
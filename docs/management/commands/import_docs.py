@@ -0,0 +1,232 @@
+# docs/management/commands/import_docs.py
+
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from docs import highlight, search
+from docs.models import Document, DocumentBlock, Like, content_changed
+
+from .export_docs import open_ndjson
+
+User = get_user_model()
+
+DOCUMENT_UPDATE_FIELDS = ["title", "author", "is_published", "order"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load NDJSON written by export_docs. Documents are upserted by slug "
+        "and their blocks replaced; likes are added if missing. Rows are "
+        "written with bulk_create, one transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, '-' for stdin")
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            dest="compress",
+            help="Decompress (implied by a .gz path)",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--default-author",
+            help="Username to use for documents whose author doesn't exist here",
+        )
+
+    def handle(self, *args, path, compress, batch_size, default_author, **options):
+        self.batch_size = batch_size
+        self.users = dict(User.objects.values_list("username", "id"))
+        self.default_author_id = None
+        if default_author is not None:
+            if default_author not in self.users:
+                raise CommandError(f"Unknown user '{default_author}'.")
+            self.default_author_id = self.users[default_author]
+
+        # slug -> id for documents written by this import, or looked up for
+        # blocks and likes that refer to documents already in the database
+        self.document_ids = {}
+        self.imported_ids = set()
+        # Imported documents that need a new version: those that existed and
+        # were overwritten. Inserted ones keep the exported updated_at.
+        self.stale_ids = set()
+        self.pending = {"document": [], "block": [], "like": []}
+        self.counts = {"document": 0, "block": 0, "like": 0, "skipped": 0}
+
+        source, close = open_ndjson(path, "r", compress=compress)
+        try:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    kind = row.pop("type")
+                except (ValueError, KeyError):
+                    raise CommandError(f"Line {number} is not an export row.")
+                if kind not in self.pending:
+                    raise CommandError(f"Line {number} has unknown type '{kind}'.")
+                self.pending[kind].append(row)
+                if len(self.pending[kind]) >= batch_size:
+                    self.flush(kind)
+            for kind in self.pending:
+                self.flush(kind)
+        finally:
+            if close:
+                source.close()
+
+        self.finish()
+        counts = self.counts
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {counts['document']} documents, {counts['block']} "
+                f"blocks and {counts['like']} likes; skipped {counts['skipped']}."
+            )
+        )
+
+    def flush(self, kind):
+        rows = self.pending[kind]
+        if kind != "document":
+            # Blocks and likes may refer to documents still in the buffer
+            self.flush("document")
+            self.resolve({row["document"] for row in rows})
+        if rows:
+            with transaction.atomic():
+                getattr(self, f"write_{kind}s")(rows)
+        self.pending[kind] = []
+
+    def resolve(self, slugs):
+        missing = slugs - self.document_ids.keys()
+        if missing:
+            self.document_ids.update(
+                Document.objects.filter(slug__in=missing).values_list("slug", "id")
+            )
+
+    def write_documents(self, rows):
+        documents = []
+        for row in rows:
+            author_id = self.users.get(row["author"], self.default_author_id)
+            if author_id is None:
+                raise CommandError(
+                    f"Author '{row['author']}' of '{row['slug']}' doesn't exist; "
+                    "pass --default-author."
+                )
+            documents.append(
+                Document(
+                    slug=row["slug"],
+                    title=row["title"],
+                    author_id=author_id,
+                    is_published=row["is_published"],
+                    order=row["order"],
+                )
+            )
+        slugs = [document.slug for document in documents]
+        existing = set(
+            Document.objects.filter(slug__in=slugs).values_list("slug", flat=True)
+        )
+        Document.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=["slug"],
+            update_fields=DOCUMENT_UPDATE_FIELDS,
+        )
+        ids = dict(Document.objects.filter(slug__in=slugs).values_list("slug", "id"))
+        # An upserted document gets exactly the blocks in the file
+        DocumentBlock.objects.filter(document_id__in=ids.values()).delete()
+        self.restore_timestamps(rows, ids, existing)
+        self.document_ids.update(ids)
+        self.imported_ids.update(ids.values())
+        self.counts["document"] += len(documents)
+
+    def restore_timestamps(self, rows, ids, existing):
+        """
+        auto_now and auto_now_add stamp inserted rows with the current time;
+        put back the exported ones. Overwritten documents and rows from
+        exports without timestamps are left to finish() to touch.
+        """
+        documents = []
+        for row in rows:
+            pk = ids[row["slug"]]
+            created_at = parse_datetime(row.get("created_at") or "")
+            updated_at = parse_datetime(row.get("updated_at") or "")
+            if created_at is None or updated_at is None:
+                self.stale_ids.add(pk)
+                continue
+            if row["slug"] in existing:
+                self.stale_ids.add(pk)
+            documents.append(
+                Document(pk=pk, created_at=created_at, updated_at=updated_at)
+            )
+        # bulk_update doesn't run pre_save, so auto_now keeps out of it
+        Document.objects.bulk_update(documents, ["created_at", "updated_at"])
+
+    def write_blocks(self, rows):
+        blocks = []
+        for row in rows:
+            document_id = self.document_ids.get(row["document"])
+            if document_id is None:
+                self.counts["skipped"] += 1
+                continue
+            block = DocumentBlock(
+                document_id=document_id,
+                block_type=row["block_type"],
+                content=row["content"],
+                language=row["language"],
+                order=row["order"],
+                highlighted_html=row.get("highlighted_html", ""),
+                highlight_hash=row.get("highlight_hash", ""),
+            )
+            # Exported markup is kept when its hash still matches
+            highlight.apply(block)
+            blocks.append(block)
+        DocumentBlock.objects.bulk_create(blocks)
+        self.counts["block"] += len(blocks)
+
+    def write_likes(self, rows):
+        likes = []
+        for row in rows:
+            document_id = self.document_ids.get(row["document"])
+            user_id = self.users.get(row["user"])
+            if document_id is None or user_id is None:
+                self.counts["skipped"] += 1
+                continue
+            likes.append((user_id, document_id))
+        existing = set(
+            Like.objects.filter(
+                user_id__in={user_id for user_id, _ in likes},
+                document_id__in={document_id for _, document_id in likes},
+            ).values_list("user_id", "document_id")
+        )
+        new = set(likes) - existing
+        Like.objects.bulk_create(
+            (
+                Like(user_id=user_id, document_id=document_id)
+                for user_id, document_id in new
+            ),
+            ignore_conflicts=True,
+        )
+        self.counts["like"] += len(new)
+
+    def finish(self):
+        """
+        bulk_create skips signals, so bring the denormalized data up to
+        date: like counters, the search index, the versions of overwritten
+        documents and the prerendered snapshots.
+        """
+        call_command("recount_likes", batch_size=self.batch_size, stdout=StringIO())
+        ids = sorted(self.imported_ids)
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start : start + self.batch_size]
+            with transaction.atomic():
+                Document.objects.filter(
+                    pk__in=self.stale_ids.intersection(chunk)
+                ).touch()
+                search.index_documents(chunk)
+        # touch() announced the overwritten documents, not the inserted ones
+        if self.imported_ids - self.stale_ids:
+            content_changed.send(sender=Document)
@@ -0,0 +1,25 @@
+# docs/management/commands/prerender.py
+
+from django.core.management.base import BaseCommand
+
+from docs import prerender
+
+
+class Command(BaseCommand):
+    help = (
+        "Write JSON and HTML snapshots of published documents to PRERENDER_ROOT. "
+        "Only documents changed since the last build are rendered."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Render every document again"
+        )
+
+    def handle(self, *args, force, **options):
+        rendered, removed = prerender.build(force=force)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {rendered} documents, removed {removed} stale files."
+            )
+        )
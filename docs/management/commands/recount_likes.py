@@ -0,0 +1,55 @@
+# docs/management/commands/recount_likes.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from docs.models import Document, Like
+
+
+class Command(BaseCommand):
+    help = "Recompute Document.likes_count from the Like table in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        counts = (
+            Like.objects.filter(document=OuterRef("pk"))
+            .order_by()
+            .values("document")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        last_id = 0
+        checked = fixed = 0
+
+        while True:
+            # Locking the batch makes concurrent like toggles wait, so their
+            # F() updates land on top of the recomputed value.
+            with transaction.atomic():
+                rows = list(
+                    Document.objects.select_for_update()
+                    .filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .annotate(actual=Coalesce(Subquery(counts), 0))
+                    .values_list("pk", "likes_count", "actual")[:batch_size]
+                )
+                if not rows:
+                    break
+
+                drifted = [
+                    Document(pk=pk, likes_count=actual)
+                    for pk, likes_count, actual in rows
+                    if likes_count != actual
+                ]
+                Document.objects.bulk_update(drifted, ["likes_count"])
+
+            checked += len(rows)
+            fixed += len(drifted)
+            last_id = rows[-1][0]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} documents, fixed {fixed}.")
+        )
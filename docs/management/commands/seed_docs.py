@@ -0,0 +1,125 @@
+# docs/management/commands/seed_docs.py
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from docs import highlight, search
+from docs.models import Document, DocumentBlock, Like
+
+User = get_user_model()
+
+USER_PREFIX = "seed-"
+DOCUMENT_PREFIX = "seed-document-"
+PASSWORD = "seed-password"
+
+TEXT = (
+    "<p>Section {j} of document {i}. Lorem ipsum dolor sit amet, consectetur "
+    "adipiscing elit, sed do eiusmod tempor incididunt ut labore.</p>"
+)
+CODE = "def step_{j}(values):\n    return [value * {j} for value in values]\n"
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate N documents x M blocks x K likes x U users for benchmarks. "
+        f"Seeded users log in with password '{PASSWORD}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=100)
+        parser.add_argument("--blocks", type=int, default=20)
+        parser.add_argument("--likes", type=int, default=5)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--clear", action="store_true", help="Remove earlier seed data first"
+        )
+
+    def handle(self, *args, documents, blocks, likes, users, batch_size, **options):
+        if options["clear"]:
+            self.clear()
+        likes = min(likes, users)
+
+        with transaction.atomic():
+            # One hash for everyone; hashing per user would dominate the run
+            password = make_password(PASSWORD)
+            admin = User.objects.create(
+                username=f"{USER_PREFIX}admin", password=password, role="admin"
+            )
+            readers = User.objects.bulk_create(
+                (
+                    User(username=f"{USER_PREFIX}user-{u}", password=password)
+                    for u in range(users)
+                ),
+                batch_size=batch_size,
+            )
+            docs = Document.objects.bulk_create(
+                (
+                    Document(
+                        title=f"Seed document {i}",
+                        slug=f"{DOCUMENT_PREFIX}{i}",
+                        author=admin,
+                        # Every tenth document is a draft
+                        is_published=i % 10 != 9,
+                        order=i,
+                        likes_count=likes,
+                    )
+                    for i in range(documents)
+                ),
+                batch_size=batch_size,
+            )
+
+            pending = []
+            for i, document in enumerate(docs):
+                document_id = document.pk
+                for j in range(blocks):
+                    if j % 2:
+                        block = DocumentBlock(
+                            document_id=document_id,
+                            block_type="code",
+                            content=CODE.format(j=j),
+                            language="python",
+                            order=j,
+                        )
+                    else:
+                        block = DocumentBlock(
+                            document_id=document_id,
+                            block_type="text",
+                            content=TEXT.format(i=i, j=j),
+                            order=j,
+                        )
+                    highlight.apply(block)
+                    pending.append(block)
+                for k in range(likes):
+                    reader = readers[(i + k) % users]
+                    pending.append(Like(document_id=document_id, user_id=reader.pk))
+                if len(pending) >= batch_size:
+                    self.flush(pending, batch_size)
+            self.flush(pending, batch_size)
+
+        document_ids = [document.pk for document in docs]
+        for start in range(0, len(document_ids), batch_size):
+            search.index_documents(document_ids[start : start + batch_size])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {documents} documents x {blocks} blocks x {likes} likes, "
+                f"{users} users."
+            )
+        )
+
+    def flush(self, pending, batch_size):
+        DocumentBlock.objects.bulk_create(
+            [row for row in pending if isinstance(row, DocumentBlock)],
+            batch_size=batch_size,
+        )
+        Like.objects.bulk_create(
+            [row for row in pending if isinstance(row, Like)], batch_size=batch_size
+        )
+        pending.clear()
+
+    def clear(self):
+        Document.objects.filter(slug__startswith=DOCUMENT_PREFIX).delete()
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
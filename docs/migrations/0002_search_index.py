@@ -0,0 +1,80 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE docs_search USING fts5("
+    "title, body, tokenize='porter unicode61')",
+]
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE docs_search (
+        document_id bigint PRIMARY KEY
+            REFERENCES docs_document (id) ON DELETE CASCADE,
+        title text NOT NULL DEFAULT '',
+        body text NOT NULL DEFAULT '',
+        vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', title), 'A')
+            || setweight(to_tsvector('english', body), 'B')
+        ) STORED
+    )
+    """,
+    "CREATE INDEX docs_search_vector_gin ON docs_search USING GIN (vector)",
+]
+
+INSERT = {
+    "sqlite": "INSERT INTO docs_search (rowid, title, body) VALUES (%s, %s, %s)",
+    "postgresql": "INSERT INTO docs_search (document_id, title, body) "
+    "VALUES (%s, %s, %s)",
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        statements = SQLITE_CREATE
+    elif vendor == "postgresql":
+        statements = POSTGRES_CREATE
+    else:
+        return
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+    Document = apps.get_model("docs", "Document")
+    DocumentBlock = apps.get_model("docs", "DocumentBlock")
+    rows = []
+    for document in Document.objects.only("id", "title").iterator(chunk_size=500):
+        blocks = DocumentBlock.objects.filter(document_id=document.id).order_by(
+            "order", "id"
+        )
+        body = "\n".join(
+            strip_tags(block.content) if block.block_type == "text" else block.content
+            for block in blocks
+        )
+        rows.append((document.id, document.title, body))
+        if len(rows) >= 500:
+            insert_rows(schema_editor, vendor, rows)
+            rows = []
+    insert_rows(schema_editor, vendor, rows)
+
+
+def insert_rows(schema_editor, vendor, rows):
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(INSERT[vendor], rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE IF EXISTS docs_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("docs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_likes(apps, schema_editor):
+    Document = apps.get_model("docs", "Document")
+    Like = apps.get_model("docs", "Like")
+    counts = (
+        Like.objects.filter(document=OuterRef("pk"))
+        .order_by()
+        .values("document")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    Document.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("docs", "0002_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("docs", "0003_document_likes_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentblock",
+            name="highlight_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="documentblock",
+            name="highlighted_html",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("docs", "0004_documentblock_highlight"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["is_published", "order", "-created_at", "id"],
+                name="docs_doc_published_order_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["order", "-created_at", "id"], name="docs_doc_order_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="documentblock",
+            index=models.Index(
+                fields=["document", "order", "id"], name="docs_block_document_order_idx"
+            ),
+        ),
+    ]
@@ -2,8 +2,27 @@
 
 from django.db import models
 from django.conf import settings
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.text import slugify
 
+from . import highlight
+
+# Sent by DocumentQuerySet.touch(), so block writes that bypass save()
+# (bulk, reorder) still reach listeners
+content_changed = Signal()
+
+
+class DocumentQuerySet(models.QuerySet):
+    def touch(self):
+        """
+        Bump updated_at without going through save(). Block changes call
+        this so the document's version reflects its content.
+        """
+        count = self.update(updated_at=timezone.now())
+        content_changed.send(sender=self.model)
+        return count
+
 
 class Document(models.Model):
     title = models.CharField(max_length=200)
@@ -11,15 +30,38 @@ class Document(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     is_published = models.BooleanField(default=False)
     order = models.IntegerField(default=0)
+    # Denormalized count of Like rows, kept in step by the like toggle
+    # (recount_likes repairs drift)
+    likes_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DocumentQuerySet.as_manager()
+
     class Meta:
         ordering = ["order", "-created_at"]
+        # The list's keyset order (docs.pagination), for readers and admins
+        indexes = [
+            models.Index(
+                fields=["is_published", "order", "-created_at", "id"],
+                name="docs_doc_published_order_idx",
+            ),
+            models.Index(
+                fields=["order", "-created_at", "id"], name="docs_doc_order_idx"
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # Never write back a likes_count read earlier; it only moves
+            # through F() updates.
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "likes_count"
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -39,9 +81,28 @@ class DocumentBlock(models.Model):
     content = models.TextField()
     language = models.CharField(max_length=50, blank=True, default="")
     order = models.IntegerField(default=0)
+    # Pygments markup for code blocks, rendered when the block is written
+    highlighted_html = models.TextField(blank=True, default="")
+    highlight_hash = models.CharField(max_length=64, blank=True, default="")
 
     class Meta:
         ordering = ["order"]
+        indexes = [
+            models.Index(
+                fields=["document", "order", "id"], name="docs_block_document_order_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        highlight.apply(self)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "highlighted_html",
+                "highlight_hash",
+            }
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.document.title} - {self.block_type} #{self.order}"
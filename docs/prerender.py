@@ -0,0 +1,148 @@
+# docs/prerender.py
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.template.loader import render_to_string
+
+from .cache import document_version
+from .models import Document
+from .serializers import DocumentSerializer
+
+MANIFEST = "manifest.json"
+# Changes arriving within this many seconds share one build
+DEBOUNCE = 1.0
+
+
+def root():
+    return Path(settings.PRERENDER_ROOT)
+
+
+def load_manifest():
+    try:
+        with open(root() / MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"documents": {}}
+
+
+def write_atomic(path, content):
+    # Readers see either the old file or the new one, never a partial write
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def render_document(document):
+    """
+    Write the JSON payload and HTML snapshot of one document under
+    content-hashed names, so they can be cached forever. Returns the
+    manifest entry.
+    """
+    data = dict(DocumentSerializer(document).data)
+    # Per-user and per-like state stays with the API
+    del data["likes_count"], data["is_liked"]
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    html = render_to_string(
+        "docs/prerender.html", {"document": document, "blocks": data["blocks"]}
+    )
+
+    digest = hashlib.sha1(payload.encode()).hexdigest()[:12]
+    directory = root() / "documents"
+    directory.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "version": document_version(document),
+        "json": f"documents/{document.slug}.{digest}.json",
+        "html": f"documents/{document.slug}.{digest}.html",
+    }
+    for name, content in (("json", payload), ("html", html)):
+        path = root() / entry[name]
+        if not path.exists():
+            write_atomic(path, content)
+    return entry
+
+
+def build(force=False):
+    """
+    Bring the snapshots in line with the published documents. Only
+    documents whose version (updated_at, bumped by every block change)
+    differs from the manifest are rendered again. Returns (rendered, removed).
+    """
+    root().mkdir(parents=True, exist_ok=True)
+    with open(root() / ".lock", "w") as lock:
+        # One build at a time across every worker on the host
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        previous = load_manifest()["documents"]
+        current = {}
+        stale = []
+
+        published = Document.objects.filter(is_published=True).order_by("pk")
+        for document in published.only("id", "slug", "updated_at").iterator():
+            entry = previous.get(document.slug)
+            if (
+                not force
+                and entry is not None
+                and entry["version"] == document_version(document)
+                and (root() / entry["json"]).exists()
+            ):
+                current[document.slug] = entry
+            else:
+                stale.append(document.pk)
+
+        documents = published.filter(pk__in=stale).select_related("author")
+        for document in documents.prefetch_related("blocks").iterator(chunk_size=100):
+            current[document.slug] = render_document(document)
+
+        manifest = {"built_at": time.time(), "documents": current}
+        write_atomic(root() / MANIFEST, json.dumps(manifest, sort_keys=True))
+
+        # Files of replaced or unpublished snapshots go once the new
+        # manifest no longer points at them.
+        live = {entry[name] for entry in current.values() for name in ("json", "html")}
+        removed = 0
+        for path in (root() / "documents").glob("*"):
+            if f"documents/{path.name}" not in live:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return len(stale), removed
+
+
+_scheduled = False
+_schedule_lock = threading.Lock()
+
+
+def schedule():
+    """
+    Rebuild in a background thread shortly after a change. Called on
+    commit of any document or block write when PRERENDER_ENABLED is set.
+    """
+    global _scheduled
+    if not settings.PRERENDER_ENABLED:
+        return
+    with _schedule_lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    threading.Thread(target=_run_scheduled, daemon=True).start()
+
+
+def _run_scheduled():
+    global _scheduled
+    time.sleep(DEBOUNCE)
+    with _schedule_lock:
+        _scheduled = False
+    try:
+        build()
+    finally:
+        connections.close_all()
@@ -0,0 +1,144 @@
+# docs/queryplan.py
+
+import json
+import re
+
+from django.core.cache import cache
+from django.db import connection
+
+from .benchmark import Bench
+
+# Tables that grow with the content; a full scan or a sort of any of them
+# is a missing index
+LARGE_TABLES = ("docs_document", "docs_documentblock", "docs_like")
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+# Ordered by relevance, which no index can hold; only their scans count
+RANKED_ENDPOINTS = {"search"}
+
+
+class Recorder:
+    """execute_wrapper keeping the (sql, params) of every statement run."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(EXPLAINABLE):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params, tables=LARGE_TABLES, sorts=True):
+    """Full scans and, with `sorts`, sorts of `tables` in one statement's plan."""
+    vendor = connection.vendor
+    if vendor == "sqlite":
+        return explain_sqlite(sql, params, tables, sorts)
+    if vendor == "postgresql":
+        return explain_postgres(sql, params, tables, sorts)
+    return []
+
+
+def explain_sqlite(sql, params, tables, sorts):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[-1] for row in cursor.fetchall()]
+
+    # SQLite names the table, or its alias, being walked. A temp b-tree for
+    # ORDER BY sorts whatever the loop produced, so it counts whenever a
+    # large table is read.
+    aliases = table_aliases(sql, tables)
+    problems = []
+    reads_large_table = False
+    for detail in details:
+        match = re.match(r"(SCAN|SEARCH) (\S+)(.*)", detail)
+        if match and match[2] in aliases:
+            reads_large_table = True
+            if match[1] == "SCAN" and "USING" not in match[3]:
+                problems.append(detail)
+    if sorts and reads_large_table:
+        problems += [
+            detail for detail in details if detail.startswith("USE TEMP B-TREE")
+        ]
+    return problems
+
+
+def table_aliases(sql, tables):
+    # Django aliases tables in subqueries ("docs_like" U0); raw SQL may too
+    aliases = set(tables)
+    for table in tables:
+        aliases.update(re.findall(rf'\b"?{table}"?\s+(?:AS\s+)?"?(\w+)', sql))
+    return aliases
+
+
+def explain_postgres(sql, params, tables, sorts):
+    # Small test tables make a sequential scan the cheapest plan whatever
+    # indexes exist; with scans and sorts priced out, one that is still
+    # chosen means there was no index to use instead.
+    with connection.cursor() as cursor:
+        cursor.execute("SET enable_seqscan = off")
+        cursor.execute("SET enable_sort = off")
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute("RESET enable_seqscan")
+            cursor.execute("RESET enable_sort")
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(plan_problems(plan[0]["Plan"], tables, sorts))
+
+
+def plan_problems(node, tables, sorts=True):
+    if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in tables:
+        yield f"Seq Scan on {node['Relation Name']}"
+    elif (
+        sorts
+        and node["Node Type"] in ("Sort", "Incremental Sort")
+        and set(node_relations(node)) & set(tables)
+    ):
+        yield f"{node['Node Type']} by {', '.join(node.get('Sort Key', []))}"
+    for child in node.get("Plans", []):
+        yield from plan_problems(child, tables, sorts)
+
+
+def node_relations(node):
+    if "Relation Name" in node:
+        yield node["Relation Name"]
+    for child in node.get("Plans", []):
+        yield from node_relations(child)
+
+
+def check_endpoints(bench=None, tables=LARGE_TABLES):
+    """
+    Call every endpoint of docs.benchmark.Bench once against the seeded
+    database and explain each statement it runs, ignoring the sorts of
+    RANKED_ENDPOINTS. Returns {endpoint: [(sql, problems), ...]} for the
+    endpoints with a full scan or a sort of `tables`.
+    """
+    bench = bench or Bench(repeat=1)
+    failures = {}
+    for name, client, method, url, data, setup in bench.endpoints():
+        if not url:
+            continue
+        if setup is not None:
+            client = setup()
+        # Every endpoint from a cold cache, so cached payloads don't hide
+        # the queries that build them
+        cache.clear()
+        path = url() if callable(url) else url
+        recorder = Recorder()
+        with connection.execute_wrapper(recorder):
+            payload = data(0) if callable(data) else data
+            response = getattr(client, method)(path, payload, format="json")
+            if response.streaming:
+                b"".join(response.streaming_content)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method.upper()} {path}: {response.status_code}")
+        found = []
+        for sql, params in recorder.statements:
+            problems = explain(sql, params, tables, sorts=name not in RANKED_ENDPOINTS)
+            if problems:
+                found.append((sql, problems))
+        if found:
+            failures[name] = found
+    return failures
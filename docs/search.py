@@ -0,0 +1,256 @@
+# docs/search.py
+
+import re
+from dataclasses import dataclass
+
+from django.db import connection
+from django.utils.html import escape, strip_tags
+
+from .models import Document, DocumentBlock
+
+# Highlight markers that can't appear in indexed text; they are swapped for
+# <mark> after the snippet has been HTML-escaped.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+SNIPPET_WORDS = 16
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class SearchHit:
+    document_id: int
+    rank: float
+    title: str
+    snippet: str
+
+
+def to_html(text):
+    return (
+        escape(text or "")
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+def document_text(document_ids):
+    """
+    Yield (document_id, title, body) with block content flattened to
+    plain text in block order. Text blocks are HTML, code blocks are not.
+    """
+    bodies = {document_id: [] for document_id in document_ids}
+    blocks = (
+        DocumentBlock.objects.filter(document_id__in=document_ids)
+        .order_by("document_id", "order", "id")
+        .values_list("document_id", "block_type", "content")
+    )
+    for document_id, block_type, content in blocks.iterator(chunk_size=2000):
+        if block_type == "text":
+            content = strip_tags(content)
+        bodies[document_id].append(content)
+
+    titles = Document.objects.filter(id__in=document_ids).values_list("id", "title")
+    for document_id, title in titles:
+        yield document_id, title, "\n".join(bodies[document_id])
+
+
+class SQLiteSearchBackend:
+    """FTS5 table keyed by rowid = document id (migration 0002)."""
+
+    def index_documents(self, document_ids):
+        rows = list(document_text(document_ids))
+        with connection.cursor() as cursor:
+            self._delete(cursor, document_ids)
+            cursor.executemany(
+                "INSERT INTO docs_search (rowid, title, body) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def update_title(self, document_id, title):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE docs_search SET title = %s WHERE rowid = %s",
+                [title, document_id],
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    "INSERT INTO docs_search (rowid, title, body) VALUES (%s, %s, '')",
+                    [document_id, title],
+                )
+
+    def remove_documents(self, document_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, document_ids)
+
+    def _delete(self, cursor, document_ids):
+        placeholders = ", ".join(["%s"] * len(document_ids))
+        cursor.execute(
+            f"DELETE FROM docs_search WHERE rowid IN ({placeholders})",
+            list(document_ids),
+        )
+
+    def to_match(self, query):
+        # Quote every term so user input can't inject FTS5 syntax; the last
+        # term is a prefix match for search-as-you-type.
+        terms = [f'"{term}"' for term in TERM_RE.findall(query)]
+        if not terms:
+            return None
+        terms[-1] += "*"
+        return " ".join(terms)
+
+    def search(self, query, published_only=True, limit=20):
+        match = self.to_match(query)
+        if match is None:
+            return []
+
+        published = "AND d.is_published" if published_only else ""
+        sql = f"""
+            SELECT docs_search.rowid,
+                   bm25(docs_search, 10.0, 1.0) AS rank,
+                   highlight(docs_search, 0, %s, %s),
+                   snippet(docs_search, 1, %s, %s, '…', %s)
+            FROM docs_search
+            JOIN docs_document d ON d.id = docs_search.rowid
+            WHERE docs_search MATCH %s {published}
+            ORDER BY rank
+            LIMIT %s
+        """
+        params = [
+            HIGHLIGHT_START,
+            HIGHLIGHT_STOP,
+            HIGHLIGHT_START,
+            HIGHLIGHT_STOP,
+            SNIPPET_WORDS,
+            match,
+            limit,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25() is lower-is-better; flip it so callers sort descending
+            return [
+                SearchHit(document_id, -rank, title, snippet)
+                for document_id, rank, title, snippet in cursor.fetchall()
+            ]
+
+
+class PostgresSearchBackend:
+    """
+    docs_search table with a generated, weighted tsvector column and a GIN
+    index on it (migration 0002).
+    """
+
+    def index_documents(self, document_ids):
+        rows = list(document_text(document_ids))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO docs_search (document_id, title, body)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (document_id)
+                DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body
+                """,
+                rows,
+            )
+
+    def update_title(self, document_id, title):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO docs_search (document_id, title) VALUES (%s, %s)
+                ON CONFLICT (document_id) DO UPDATE SET title = EXCLUDED.title
+                """,
+                [document_id, title],
+            )
+
+    def remove_documents(self, document_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM docs_search WHERE document_id = ANY(%s)",
+                [list(document_ids)],
+            )
+
+    def search(self, query, published_only=True, limit=20):
+        if not TERM_RE.search(query):
+            return []
+
+        published = "AND d.is_published" if published_only else ""
+        options = (
+            f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+            f"MaxWords={SNIPPET_WORDS}, MinWords=6, MaxFragments=2"
+        )
+        # Rank and limit first so ts_headline only runs on the returned rows
+        sql = f"""
+            WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+            hits AS (
+                SELECT s.document_id, s.title, s.body,
+                       ts_rank_cd(s.vector, q.query) AS rank
+                FROM docs_search s
+                JOIN docs_document d ON d.id = s.document_id, q
+                WHERE s.vector @@ q.query {published}
+                ORDER BY rank DESC
+                LIMIT %s
+            )
+            SELECT hits.document_id, hits.rank,
+                   ts_headline('english', hits.title, q.query, %s),
+                   ts_headline('english', hits.body, q.query, %s)
+            FROM hits, q
+            ORDER BY hits.rank DESC
+        """
+        title_options = f"{options}, HighlightAll=true"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [query, limit, title_options, options])
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """Unindexed LIKE search for databases without a full-text backend."""
+
+    def index_documents(self, document_ids):
+        pass
+
+    def update_title(self, document_id, title):
+        pass
+
+    def remove_documents(self, document_ids):
+        pass
+
+    def search(self, query, published_only=True, limit=20):
+        query = query.strip()
+        if not query:
+            return []
+
+        documents = Document.objects.all()
+        if published_only:
+            documents = documents.filter(is_published=True)
+        title_matches = documents.filter(title__icontains=query)
+        block_matches = documents.filter(blocks__content__icontains=query)
+        ids = (title_matches | block_matches).distinct().values_list("id", flat=True)
+        ids = ids[:limit]
+        return [SearchHit(document_id, 0.0, "", "") for document_id in ids]
+
+
+def get_backend():
+    if connection.vendor == "sqlite":
+        return SQLiteSearchBackend()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+def index_documents(document_ids):
+    document_ids = list(document_ids)
+    if document_ids:
+        get_backend().index_documents(document_ids)
+
+
+def update_title(document):
+    get_backend().update_title(document.pk, document.title)
+
+
+def remove_documents(document_ids):
+    document_ids = list(document_ids)
+    if document_ids:
+        get_backend().remove_documents(document_ids)
+
+
+def search(query, published_only=True, limit=20):
+    return get_backend().search(query, published_only=published_only, limit=limit)
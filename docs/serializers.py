@@ -2,18 +2,41 @@
 
 from rest_framework import serializers
 from .models import Document, DocumentBlock, Like
+from .search import to_html
 
 
 class DocumentBlockSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentBlock
-        fields = ["id", "block_type", "content", "language", "order"]
+        fields = [
+            "id",
+            "block_type",
+            "content",
+            "language",
+            "order",
+            "highlighted_html",
+        ]
+        read_only_fields = ["highlighted_html"]
+
 
+class SparseFieldsMixin:
+    """
+    Serializes only the names in `fields`, when given, or else in the
+    class's DEFAULT_FIELDS, if it has them; see docs.fieldsets.
+    """
 
-class DocumentSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            fields = getattr(self, "DEFAULT_FIELDS", None)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class DocumentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     blocks = DocumentBlockSerializer(many=True, read_only=True)
     author_username = serializers.CharField(source="author.username", read_only=True)
-    likes_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
 
     class Meta:
@@ -32,21 +55,41 @@ class DocumentSerializer(serializers.ModelSerializer):
             "likes_count",
             "is_liked",
         ]
-        read_only_fields = ["slug", "author", "created_at", "updated_at"]
-
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+        read_only_fields = ["slug", "author", "likes_count", "created_at", "updated_at"]
 
     def get_is_liked(self, obj):
+        is_liked = getattr(obj, "is_liked", None)
+        if is_liked is not None:
+            return is_liked
         request = self.context.get("request")
         if request and request.user.is_authenticated:
-            return Like.objects.filter(user=request.user, document=obj).exists()
+            return Like.objects.filter(user_id=request.user.id, document=obj).exists()
         return False
 
 
-class DocumentListSerializer(serializers.ModelSerializer):
+class DocumentHeaderSerializer(DocumentSerializer):
+    """DocumentSerializer without blocks; the stream sends those one by one."""
+
+    blocks = None
+
+    class Meta(DocumentSerializer.Meta):
+        fields = [f for f in DocumentSerializer.Meta.fields if f != "blocks"]
+
+
+class DocumentListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author_username = serializers.CharField(source="author.username", read_only=True)
-    likes_count = serializers.SerializerMethodField()
+    # Only with ?include=blocks
+    blocks = DocumentBlockSerializer(many=True, read_only=True)
+
+    DEFAULT_FIELDS = [
+        "id",
+        "title",
+        "slug",
+        "author_username",
+        "is_published",
+        "order",
+        "likes_count",
+    ]
 
     class Meta:
         model = Document
@@ -58,10 +101,27 @@ class DocumentListSerializer(serializers.ModelSerializer):
             "is_published",
             "order",
             "likes_count",
+            "blocks",
         ]
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+
+class SearchResultSerializer(serializers.Serializer):
+    """
+    Serializes (SearchHit, Document) pairs. title_html and snippet_html are
+    escaped text with matches wrapped in <mark>.
+    """
+
+    def to_representation(self, instance):
+        hit, document = instance
+        return {
+            "id": document.id,
+            "title": document.title,
+            "slug": document.slug,
+            "author_username": document.author.username,
+            "rank": hit.rank,
+            "title_html": to_html(hit.title) or to_html(document.title),
+            "snippet_html": to_html(hit.snippet),
+        }
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -0,0 +1,40 @@
+# docs/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import prerender, search
+from .models import Document, DocumentBlock, content_changed
+
+
+@receiver(post_save, sender=Document)
+def index_document_title(sender, instance, **kwargs):
+    search.update_title(instance)
+
+
+@receiver(post_delete, sender=Document)
+def remove_document_from_index(sender, instance, **kwargs):
+    search.remove_documents([instance.pk])
+
+
+@receiver(post_save, sender=DocumentBlock)
+def touch_document_on_block_save(sender, instance, **kwargs):
+    Document.objects.filter(pk=instance.document_id).touch()
+    search.index_documents([instance.document_id])
+
+
+@receiver(post_delete, sender=DocumentBlock)
+def touch_document_on_block_delete(sender, instance, origin=None, **kwargs):
+    # Cascades and queryset deletes touch the document once themselves
+    # instead of once per block.
+    if origin is instance:
+        Document.objects.filter(pk=instance.document_id).touch()
+        search.index_documents([instance.document_id])
+
+
+@receiver(content_changed)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def schedule_prerender(sender, **kwargs):
+    transaction.on_commit(prerender.schedule)
@@ -0,0 +1,1289 @@
+# docs/tests.py
+
+import base64
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from . import benchmark, loadgen, prerender, queryplan, search
+from .cache import get_or_build
+from .management.commands.highlight_blocks import Command as HighlightBlocks
+from .highlight import highlight_hash
+from .models import Document, DocumentBlock, Like
+
+User = get_user_model()
+
+
+def create_documents(author, count, published=True):
+    return Document.objects.bulk_create(
+        Document(
+            title=f"Document {i}",
+            slug=f"{author.username}-document-{i}",
+            author=author,
+            is_published=published,
+            order=i,
+        )
+        for i in range(count)
+    )
+
+
+class DocumentListQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_list_queries(self, count):
+        authors = [
+            User.objects.create_user(username=f"author{i}", password="pass")
+            for i in range(3)
+        ]
+        # The remainder goes to the first author, so exactly `count` exist
+        per_author, remainder = divmod(count, len(authors))
+        for i, author in enumerate(authors):
+            documents = create_documents(
+                author, per_author + (remainder if i == 0 else 0)
+            )
+            Like.objects.bulk_create(
+                Like(user=self.user, document=document) for document in documents
+            )
+        call_command("recount_likes", stdout=StringIO())
+        self.assertEqual(Document.objects.count(), count)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/docs/documents/?page_size=100")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list_10_documents(self):
+        data = self.assert_list_queries(10)
+        self.assertEqual(len(data["results"]), 10)
+        self.assertIsNone(data["next"])
+        self.assertEqual(data["results"][0]["likes_count"], 1)
+        self.assertTrue(data["results"][0]["author_username"].startswith("author"))
+
+    def test_list_1000_documents(self):
+        data = self.assert_list_queries(1000)
+        self.assertEqual(len(data["results"]), 100)
+        self.assertIsNotNone(data["next"])
+
+
+class DocumentPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.documents = create_documents(self.user, 25)
+        # Ties on `order` must still page through every document exactly once
+        Document.objects.update(order=0)
+
+    def test_walk_forward_and_back(self):
+        url = "/api/docs/documents/?page_size=10"
+        seen = []
+        pages = []
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            pages.append(data)
+            seen.extend(doc["id"] for doc in data["results"])
+            url = data["next"]
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), {doc.id for doc in self.documents})
+
+        previous = self.client.get(pages[2]["previous"]).json()
+        self.assertEqual(previous["results"], pages[1]["results"])
+
+    def test_page_size_is_capped(self):
+        create_documents(
+            User.objects.create_user(username="other", password="pass"), 150
+        )
+        data = self.client.get("/api/docs/documents/?page_size=1000").json()
+        self.assertEqual(len(data["results"]), 100)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/docs/documents/?cursor=garbage")
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_cursor_position(self):
+        created_at = "2020-01-01T00:00:00+00:00"
+        for position in (
+            ["x", created_at, 1],
+            [0, created_at, "zz"],
+            [None, created_at, 1],
+            [0, "2020-01-01T00:00:00", 1],
+            [0, None, 1],
+            [0, created_at],
+        ):
+            payload = json.dumps({"p": position, "r": 0}).encode()
+            cursor = base64.urlsafe_b64encode(payload).decode()
+            response = self.client.get(f"/api/docs/documents/?cursor={cursor}")
+            self.assertEqual(response.status_code, 404, position)
+            self.assertEqual(response.json(), {"detail": "Invalid cursor"})
+
+
+class DocumentDetailQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document = create_documents(self.user, 1)[0]
+        DocumentBlock.objects.bulk_create(
+            DocumentBlock(document=self.document, block_type="text", content=str(i))
+            for i in range(20)
+        )
+
+    def test_retrieve_annotates_likes(self):
+        self.client.post(f"/api/docs/documents/{self.document.slug}/like/")
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/docs/documents/{self.document.slug}/")
+        data = response.json()
+        self.assertTrue(data["is_liked"])
+        self.assertEqual(len(data["blocks"]), 20)
+
+    def test_retrieve_not_liked(self):
+        response = self.client.get(f"/api/docs/documents/{self.document.slug}/")
+        data = response.json()
+        self.assertEqual(data["likes_count"], 0)
+        self.assertFalse(data["is_liked"])
+
+
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document = create_documents(self.user, 1)[0]
+        self.url = f"/api/docs/documents/{self.document.slug}/"
+        DocumentBlock.objects.bulk_create(
+            DocumentBlock(document=self.document, block_type="text", content=str(i))
+            for i in range(3)
+        )
+
+    def get(self, url, queries):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(captured), queries)
+        return response, captured[0]["sql"]
+
+    def test_list_fields(self):
+        response, sql = self.get(
+            "/api/docs/documents/?fields=id,title,slug,likes_count", 1
+        )
+        self.assertEqual(
+            list(response.json()["results"][0]),
+            ["id", "title", "slug", "likes_count"],
+        )
+        self.assertNotIn("accounts_customuser", sql)
+        self.assertNotIn('"is_published",', sql.split(" FROM ")[0])
+
+    def test_list_include_blocks(self):
+        response, _ = self.get("/api/docs/documents/?include=blocks", 2)
+        document = response.json()["results"][0]
+        self.assertEqual(document["author_username"], "reader")
+        self.assertEqual(
+            [block["content"] for block in document["blocks"]], ["0", "1", "2"]
+        )
+
+    def test_detail_exclude_blocks(self):
+        response, _ = self.get(f"{self.url}?exclude=blocks", 1)
+        data = response.json()
+        self.assertNotIn("blocks", data)
+        self.assertFalse(data["is_liked"])
+
+        # The full payload is cached apart from the narrowed one
+        response, _ = self.get(self.url, 2)
+        self.assertEqual(len(response.json()["blocks"]), 3)
+
+    def test_detail_fields(self):
+        response, sql = self.get(f"{self.url}?fields=title,blocks", 2)
+        self.assertEqual(list(response.json()), ["title", "blocks"])
+        self.assertNotIn("EXISTS", sql)
+        self.assertNotIn('"likes_count"', sql)
+
+    def test_stream_exclude_blocks(self):
+        response = self.client.get(f"{self.url}?stream=1&exclude=blocks")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["type"], "document")
+
+    def test_etag_depends_on_fields(self):
+        full = self.client.get(self.url)
+        narrow = self.client.get(
+            f"{self.url}?fields=title", HTTP_IF_NONE_MATCH=full["ETag"]
+        )
+        self.assertEqual(narrow.status_code, 200)
+        self.assertNotEqual(narrow["ETag"], full["ETag"])
+
+    def test_unknown_field(self):
+        for url in (
+            "/api/docs/documents/?fields=title,password",
+            f"{self.url}?exclude=nope",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("fields", response.json())
+
+    @override_settings(ROOT_URLCONF="config.urls_async")
+    def test_async_views(self):
+        client = APIClient()
+        client.post("/api/auth/login/", {"username": "reader", "password": "pass"})
+        self.async_client.cookies = client.cookies
+        list_response = async_to_sync(self.async_client.get)(
+            "/api/docs/documents/?fields=id,slug"
+        )
+        self.assertEqual(list(list_response.json()["results"][0]), ["id", "slug"])
+        detail = async_to_sync(self.async_client.get)(f"{self.url}?exclude=blocks")
+        self.assertNotIn("blocks", detail.json())
+        self.assertIn("is_liked", detail.json())
+
+
+class DocumentDetailCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.document = create_documents(self.admin, 1)[0]
+        self.block = DocumentBlock.objects.create(
+            document=self.document, block_type="text", content="first"
+        )
+        self.url = f"/api/docs/documents/{self.document.slug}/"
+
+    def get_contents(self):
+        return [
+            block["content"] for block in self.client.get(self.url).json()["blocks"]
+        ]
+
+    def test_hit_skips_blocks_query(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()["blocks"][0]["content"], "first")
+
+    def test_like_state_is_per_request(self):
+        self.client.get(self.url)
+        self.client.post(f"{self.url}like/")
+        data = self.client.get(self.url).json()
+        self.assertTrue(data["is_liked"])
+
+    def test_block_save_invalidates(self):
+        self.get_contents()
+        self.block.content = "edited"
+        self.block.save()
+        self.assertEqual(self.get_contents(), ["edited"])
+
+    def test_block_delete_invalidates(self):
+        self.get_contents()
+        self.block.delete()
+        self.assertEqual(self.get_contents(), [])
+
+    def test_bulk_update_invalidates(self):
+        self.get_contents()
+        self.client.post(
+            f"/api/docs/documents/{self.document.pk}/blocks/bulk/",
+            {"blocks": [{"block_type": "text", "content": "bulk", "order": 0}]},
+            format="json",
+        )
+        self.assertEqual(self.get_contents(), ["bulk"])
+
+    def test_reorder_invalidates(self):
+        second = DocumentBlock.objects.create(
+            document=self.document, block_type="text", content="second", order=1
+        )
+        self.get_contents()
+        self.client.patch(
+            f"/api/docs/documents/{self.document.pk}/blocks/reorder/",
+            {
+                "items": [
+                    {"id": self.block.pk, "order": 1},
+                    {"id": second.pk, "order": 0},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(self.get_contents(), ["second", "first"])
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+        barrier = threading.Barrier(8)
+
+        def build():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"value": 1}
+
+        def worker():
+            barrier.wait()
+            results.append(get_or_build("single-flight-test", build))
+
+        results = []
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 1}] * 8)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.document = create_documents(self.admin, 1)[0]
+        self.block = DocumentBlock.objects.create(
+            document=self.document, block_type="text", content="first"
+        )
+
+    def assert_revalidates(self, url, change, last_modified=True):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(response.has_header("Last-Modified"), last_modified)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        if last_modified:
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def change_block(self):
+        self.block.content = "edited"
+        self.block.save()
+
+    def test_list(self):
+        self.assert_revalidates(
+            "/api/docs/documents/",
+            lambda: self.client.post(f"/api/docs/documents/{self.document.slug}/like/"),
+            last_modified=False,
+        )
+
+    def test_detail(self):
+        self.assert_revalidates(
+            f"/api/docs/documents/{self.document.slug}/",
+            self.change_block,
+            last_modified=False,
+        )
+
+    def test_detail_without_like_fields(self):
+        self.assert_revalidates(
+            f"/api/docs/documents/{self.document.slug}/?exclude=likes_count,is_liked",
+            self.change_block,
+        )
+
+    def test_like_invalidates_if_modified_since(self):
+        # Likes leave updated_at alone; a date alone can't validate the page
+        url = f"/api/docs/documents/{self.document.slug}/"
+        since = http_date(time.time() + 60)
+        self.client.post(f"{url}like/")
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200
+        )
+        self.assertEqual(
+            self.client.get(
+                "/api/docs/documents/", HTTP_IF_MODIFIED_SINCE=since
+            ).status_code,
+            200,
+        )
+
+    def test_detail_not_modified_skips_blocks(self):
+        url = f"/api/docs/documents/{self.document.slug}/"
+        etag = self.client.get(url)["ETag"]
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_blocks(self):
+        self.assert_revalidates(
+            f"/api/docs/documents/{self.document.pk}/blocks/", self.change_block
+        )
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.python = Document.objects.create(
+            title="Python basics", author=self.user, is_published=True
+        )
+        self.django = Document.objects.create(
+            title="Django views", author=self.user, is_published=True
+        )
+        self.block = DocumentBlock.objects.create(
+            document=self.django,
+            block_type="text",
+            content="<p>Views are <strong>python</strong> callables.</p>",
+        )
+
+    def search(self, query):
+        response = self.client.get("/api/docs/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_ranks_title_above_body(self):
+        results = self.search("python")
+        self.assertEqual(
+            [r["slug"] for r in results], ["python-basics", "django-views"]
+        )
+        self.assertIn("<mark>Python</mark>", results[0]["title_html"])
+        self.assertIn("<mark>python</mark>", results[1]["snippet_html"])
+        self.assertNotIn("<strong>", results[1]["snippet_html"])
+
+    def test_prefix_and_operators_are_literal(self):
+        self.assertEqual(len(self.search("callab")), 1)
+        self.assertEqual(self.search('"NEAR(*'), [])
+
+    def test_index_follows_block_changes(self):
+        self.block.content = "Generic class based views"
+        self.block.save()
+        self.assertEqual(len(self.search("generic")), 1)
+        self.block.delete()
+        self.assertEqual(self.search("generic"), [])
+
+    def test_index_follows_document_changes(self):
+        self.python.title = "Rust basics"
+        self.python.save()
+        self.assertEqual([r["slug"] for r in self.search("rust")], ["python-basics"])
+        self.python.delete()
+        self.assertEqual(self.search("rust"), [])
+
+    def test_unpublished_hidden_from_users(self):
+        Document.objects.filter(pk=self.python.pk).update(is_published=False)
+        self.assertEqual([r["slug"] for r in self.search("basics")], [])
+
+
+class BlockBulkUpdateTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.document = create_documents(self.admin, 1)[0]
+        self.blocks = DocumentBlock.objects.bulk_create(
+            DocumentBlock(
+                document=self.document, block_type="text", content=str(i), order=i
+            )
+            for i in range(3)
+        )
+        self.url = f"/api/docs/documents/{self.document.pk}/blocks/bulk/"
+
+    def payload(self, block, **changes):
+        data = {
+            "id": block.id,
+            "block_type": block.block_type,
+            "content": block.content,
+            "language": block.language,
+            "order": block.order,
+        }
+        return {**data, **changes}
+
+    def test_diff_is_applied(self):
+        first, second, third = self.blocks
+        response = self.client.post(
+            self.url,
+            {
+                "blocks": [
+                    self.payload(first),
+                    self.payload(second, content="changed"),
+                    {"block_type": "code", "content": "print()", "order": 2},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["ids"][:2], [first.id, second.id])
+        self.assertEqual((data["created"], data["updated"], data["deleted"]), (1, 1, 1))
+        self.assertEqual(
+            list(
+                DocumentBlock.objects.filter(document=self.document).values_list(
+                    "id", "content"
+                )
+            ),
+            [(first.id, "0"), (second.id, "changed"), (data["ids"][2], "print()")],
+        )
+        self.assertFalse(DocumentBlock.objects.filter(id=third.id).exists())
+
+    def test_unchanged_payload_writes_nothing(self):
+        blocks = [self.payload(block) for block in self.blocks]
+        # document, blocks, and the savepoint pair of the atomic block
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, {"blocks": blocks}, format="json")
+        self.assertEqual(response.json()["ids"], [block.id for block in self.blocks])
+
+    def test_invalid_block_is_rejected(self):
+        response = self.client.post(
+            self.url,
+            {"blocks": [{"block_type": "video", "content": "x"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DocumentBlock.objects.count(), 3)
+
+    def test_foreign_ids_are_inserted(self):
+        other = create_documents(
+            User.objects.create_user(username="other", password="pass"), 1
+        )[0]
+        foreign = DocumentBlock.objects.create(
+            document=other, block_type="text", content="foreign"
+        )
+        response = self.client.post(
+            self.url, {"blocks": [self.payload(foreign)]}, format="json"
+        )
+        self.assertNotEqual(response.json()["ids"], [foreign.id])
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.document, other)
+
+
+class ReorderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.document = create_documents(self.admin, 1)[0]
+
+    def create_blocks(self, count, document=None):
+        return DocumentBlock.objects.bulk_create(
+            DocumentBlock(
+                document=document or self.document,
+                block_type="text",
+                content=str(i),
+                order=i,
+            )
+            for i in range(count)
+        )
+
+    def reorder_blocks(self, items):
+        return self.client.patch(
+            f"/api/docs/documents/{self.document.pk}/blocks/reorder/",
+            {"items": items},
+            format="json",
+        )
+
+    def test_query_count_is_constant(self):
+        for count in (10, 300):
+            blocks = self.create_blocks(count)
+            items = [
+                {"id": block.id, "order": count - i} for i, block in enumerate(blocks)
+            ]
+            # savepoints, ownership check, CASE update, touch
+            with self.assertNumQueries(5):
+                response = self.reorder_blocks(items)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(DocumentBlock.objects.get(pk=blocks[0].pk).order, count)
+            DocumentBlock.objects.all().delete()
+
+    def test_foreign_ids_are_rejected(self):
+        block = self.create_blocks(1)[0]
+        other = create_documents(
+            User.objects.create_user(username="other", password="pass"), 1
+        )[0]
+        foreign = self.create_blocks(1, document=other)[0]
+        response = self.reorder_blocks(
+            [{"id": block.id, "order": 5}, {"id": foreign.id, "order": 6}]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DocumentBlock.objects.get(pk=block.pk).order, 0)
+        self.assertEqual(DocumentBlock.objects.get(pk=foreign.pk).order, 0)
+
+    def test_malformed_items_are_rejected(self):
+        response = self.reorder_blocks([{"id": "x"}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_documents(self):
+        documents = create_documents(
+            User.objects.create_user(username="writer", password="pass"), 3
+        )
+        response = self.client.patch(
+            "/api/docs/documents/reorder/",
+            {"items": [{"id": doc.id, "order": 10 - doc.order} for doc in documents]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(
+                Document.objects.filter(id__in=[d.id for d in documents]).values_list(
+                    "order", flat=True
+                )
+            ),
+            [8, 9, 10],
+        )
+
+
+class LikeToggleTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document = create_documents(self.user, 1)[0]
+        self.url = f"/api/docs/documents/{self.document.slug}/like/"
+
+    def test_toggle_returns_state_and_count(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.json(), {"status": "liked", "is_liked": True, "likes_count": 1}
+        )
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"status": "unliked", "is_liked": False, "likes_count": 0}
+        )
+        self.assertFalse(Like.objects.exists())
+
+    def test_document_save_keeps_counter(self):
+        stale = Document.objects.get(pk=self.document.pk)
+        self.client.post(self.url)
+        stale.title = "Renamed"
+        stale.save()
+        self.assertEqual(Document.objects.get(pk=self.document.pk).likes_count, 1)
+
+    def test_recount_fixes_drift(self):
+        other = User.objects.create_user(username="other", password="pass")
+        Like.objects.create(user=other, document=self.document)
+        Document.objects.filter(pk=self.document.pk).update(likes_count=7)
+        out = StringIO()
+        call_command("recount_likes", batch_size=1, stdout=out)
+        self.assertEqual(Document.objects.get(pk=self.document.pk).likes_count, 1)
+        self.assertIn("fixed 1", out.getvalue())
+
+
+class HighlightTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.document = create_documents(self.admin, 1)[0]
+        self.url = f"/api/docs/documents/{self.document.pk}/blocks/"
+
+    def test_code_block_highlighted_on_create(self):
+        response = self.client.post(
+            self.url,
+            {
+                "block_type": "code",
+                "content": "def f():\n    pass",
+                "language": "python",
+            },
+            format="json",
+        )
+        html = response.json()["highlighted_html"]
+        self.assertIn('<span class="k">def</span>', html)
+        self.assertIn('<span class="nf">f</span>', html)
+
+        detail = self.client.get(f"/api/docs/documents/{self.document.slug}/")
+        self.assertEqual(detail.json()["blocks"][0]["highlighted_html"], html)
+
+    def test_text_and_unknown_language(self):
+        text = DocumentBlock.objects.create(
+            document=self.document, block_type="text", content="<p>x</p>"
+        )
+        code = DocumentBlock.objects.create(
+            document=self.document, block_type="code", content="a < b", language="nope"
+        )
+        self.assertEqual(text.highlighted_html, "")
+        self.assertEqual(code.highlighted_html, "a &lt; b")
+
+    def test_bulk_update_highlights(self):
+        response = self.client.post(
+            f"{self.url}bulk/",
+            {"blocks": [{"block_type": "code", "content": "x = 1", "language": "py"}]},
+            format="json",
+        )
+        block = DocumentBlock.objects.get(pk=response.json()["ids"][0])
+        self.assertIn('<span class="mi">1</span>', block.highlighted_html)
+        self.assertEqual(block.highlight_hash, highlight_hash("x = 1", "py"))
+
+    def test_backfill_command(self):
+        DocumentBlock.objects.bulk_create(
+            DocumentBlock(
+                document=self.document,
+                block_type="code",
+                content=f"x = {i}",
+                language="python",
+                order=i,
+            )
+            for i in range(5)
+        )
+        out = StringIO()
+        call_command("highlight_blocks", batch_size=2, workers=2, stdout=out)
+        self.assertIn("Highlighted 5 code blocks", out.getvalue())
+        for block in DocumentBlock.objects.all():
+            self.assertIn('<span class="mi">', block.highlighted_html)
+
+        out = StringIO()
+        call_command("highlight_blocks", workers=1, stdout=out)
+        self.assertIn("Highlighted 0 code blocks", out.getvalue())
+
+    def test_backfill_touches_documents(self):
+        block = DocumentBlock.objects.bulk_create(
+            [
+                DocumentBlock(
+                    document=self.document,
+                    block_type="code",
+                    content="x = 1",
+                    language="python",
+                )
+            ]
+        )[0]
+        cache.clear()
+        detail = self.client.get(f"/api/docs/documents/{self.document.slug}/")
+        self.assertEqual(detail.json()["blocks"][0]["highlighted_html"], "")
+
+        before = Document.objects.get(pk=self.document.pk).updated_at
+        call_command("highlight_blocks", workers=1, stdout=StringIO())
+        self.assertGreater(Document.objects.get(pk=self.document.pk).updated_at, before)
+        detail = self.client.get(f"/api/docs/documents/{self.document.slug}/")
+        self.assertIn(
+            '<span class="mi">', detail.json()["blocks"][0]["highlighted_html"]
+        )
+
+        # A block edited after it was rendered keeps its own highlight
+        rows = [(block.pk, highlight_hash("x = 1", "python"), "stale")]
+        DocumentBlock.objects.filter(pk=block.pk).update(content="y = 2")
+        HighlightBlocks().store(rows)
+        self.assertNotEqual(
+            DocumentBlock.objects.get(pk=block.pk).highlighted_html, "stale"
+        )
+
+
+class BlockStreamingTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.document = create_documents(self.author, 1)[0]
+        # Orders repeat, so the window has to break ties on id
+        self.blocks = DocumentBlock.objects.bulk_create(
+            DocumentBlock(
+                document=self.document, block_type="text", content=str(i), order=i // 2
+            )
+            for i in range(7)
+        )
+        self.url = f"/api/docs/documents/{self.document.pk}/blocks/"
+
+    def test_stream_detail(self):
+        response = self.client.get(
+            f"/api/docs/documents/{self.document.slug}/?stream=1"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        header, blocks = lines[0], lines[1:]
+        self.assertEqual(header["type"], "document")
+        self.assertEqual(header["slug"], self.document.slug)
+        self.assertNotIn("blocks", header)
+        self.assertEqual(
+            [block["content"] for block in blocks], [str(i) for i in range(7)]
+        )
+
+        etag = response["ETag"]
+        response = self.client.get(
+            f"/api/docs/documents/{self.document.slug}/?stream=1",
+            headers={"if-none-match": etag},
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_block_windows(self):
+        contents, params = [], "limit=3"
+        while True:
+            window = self.client.get(f"{self.url}?{params}").json()
+            contents += [block["content"] for block in window]
+            if len(window) < 3:
+                break
+            last = window[-1]
+            params = f"after_order={last['order']}&after_id={last['id']}&limit=3"
+        self.assertEqual(contents, [str(i) for i in range(7)])
+
+    def test_unpublished_blocks_hidden_from_readers(self):
+        Document.objects.filter(pk=self.document.pk).update(is_published=False)
+        self.assertEqual(self.client.get(self.url).json(), [])
+        response = self.client.post(self.url, {"block_type": "text", "content": "x"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_window(self):
+        response = self.client.get(f"{self.url}?after_order=x")
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportImportTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.documents = create_documents(self.author, 3)
+        for document in self.documents:
+            DocumentBlock.objects.create(
+                document=document, block_type="text", content="hello world"
+            )
+            DocumentBlock.objects.create(
+                document=document, block_type="code", content="x = 1", language="py"
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.client.post(f"/api/docs/documents/{self.documents[0].slug}/like/")
+
+    def timestamps(self):
+        return list(
+            Document.objects.order_by("order", "created_at", "id").values_list(
+                "slug", "created_at", "updated_at"
+            )
+        )
+
+    def snapshot(self):
+        return (
+            list(Document.objects.order_by("slug").values_list("slug", "likes_count")),
+            list(
+                DocumentBlock.objects.order_by(
+                    "document__slug", "order", "id"
+                ).values_list("document__slug", "content", "highlighted_html")
+            ),
+        )
+
+    def round_trip(self, filename):
+        path = os.path.join(self.tmp.name, filename)
+        before = self.snapshot()
+        timestamps = self.timestamps()
+        call_command("export_docs", path, stderr=StringIO())
+        Document.objects.all().delete()
+
+        out = StringIO()
+        call_command("import_docs", path, batch_size=2, stdout=out)
+        self.assertIn("Imported 3 documents, 6 blocks and 1 likes", out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.timestamps(), timestamps)
+        return path
+
+    def test_round_trip(self):
+        self.round_trip("docs.ndjson")
+        hits = search.search("hello")
+        self.assertEqual(len(hits), 3)
+
+    def test_round_trip_keeps_default_ordering(self):
+        # With a shared order, created_at decides
+        Document.objects.update(order=0)
+        for i, document in enumerate(self.documents):
+            Document.objects.filter(pk=document.pk).update(
+                created_at=timezone.now() - timedelta(days=i + 1)
+            )
+        slugs = list(Document.objects.values_list("slug", flat=True))
+        self.assertEqual(slugs, [document.slug for document in self.documents])
+        self.round_trip("docs.ndjson")
+        self.assertEqual(list(Document.objects.values_list("slug", flat=True)), slugs)
+
+    def test_gzip_round_trip(self):
+        path = self.round_trip("docs.ndjson.gz")
+        with gzip.open(path, "rt") as f:
+            self.assertEqual(json.loads(f.readline())["type"], "document")
+
+    def test_reimport_upserts_by_slug(self):
+        path = os.path.join(self.tmp.name, "docs.ndjson")
+        call_command("export_docs", path, stderr=StringIO())
+        before = self.snapshot()
+        Document.objects.filter(pk=self.documents[1].pk).update(title="Changed")
+        updated_at = Document.objects.get(pk=self.documents[1].pk).updated_at
+
+        out = StringIO()
+        call_command("import_docs", path, stdout=out)
+        # The like is already there; overwritten documents get a new version
+        self.assertIn("Imported 3 documents, 6 blocks and 0 likes", out.getvalue())
+        self.assertGreater(
+            Document.objects.get(pk=self.documents[1].pk).updated_at, updated_at
+        )
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(Document.objects.count(), 3)
+        self.assertEqual(
+            Document.objects.get(pk=self.documents[1].pk).title, "Document 1"
+        )
+
+    def test_unknown_author(self):
+        path = os.path.join(self.tmp.name, "docs.ndjson")
+        call_command("export_docs", path, stderr=StringIO())
+        Document.objects.all().delete()
+        User.objects.filter(pk=self.author.pk).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("import_docs", path, stdout=StringIO())
+        call_command("import_docs", path, default_author="reader", stdout=StringIO())
+        self.assertEqual(Document.objects.filter(author=self.reader).count(), 3)
+
+
+class PrerenderTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(
+            PRERENDER_ROOT=self.tmp.name, PRERENDER_ENABLED=True
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.author = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.published, self.other = create_documents(self.author, 2)
+        self.draft = create_documents(
+            User.objects.create_user(username="drafter", password="pass"),
+            1,
+            published=False,
+        )[0]
+        DocumentBlock.objects.create(
+            document=self.published, block_type="code", content="x = 1", language="py"
+        )
+        self.client = APIClient()
+
+    def manifest(self):
+        response = self.client.get("/prerender/manifest.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        return json.loads(b"".join(response.streaming_content))["documents"]
+
+    def test_build_and_serve(self):
+        out = StringIO()
+        call_command("prerender", stdout=out)
+        self.assertIn("Rendered 2 documents", out.getvalue())
+
+        documents = self.manifest()
+        self.assertEqual(set(documents), {self.published.slug, self.other.slug})
+        entry = documents[self.published.slug]
+        response = self.client.get(f"/prerender/{entry['json']}")
+        self.assertIn("immutable", response["Cache-Control"])
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(data["slug"], self.published.slug)
+        self.assertIn(
+            '<span class="mi">1</span>', data["blocks"][0]["highlighted_html"]
+        )
+        self.assertNotIn("is_liked", data)
+
+        response = self.client.get(f"/prerender/{entry['html']}")
+        self.assertEqual(response["Content-Security-Policy"], "script-src 'none'")
+        self.assertIn(b"<h1>Document 0</h1>", b"".join(response.streaming_content))
+
+    def test_incremental_rebuild(self):
+        prerender.build()
+        before = self.manifest()
+
+        DocumentBlock.objects.create(
+            document=self.other, block_type="text", content="new"
+        )
+        self.draft.is_published = True
+        self.draft.save()
+        rendered, removed = prerender.build()
+
+        after = self.manifest()
+        self.assertEqual(rendered, 2)
+        self.assertEqual(removed, 2)
+        self.assertEqual(after[self.published.slug], before[self.published.slug])
+        self.assertNotEqual(after[self.other.slug], before[self.other.slug])
+        self.assertIn(self.draft.slug, after)
+        self.assertEqual(
+            self.client.get(
+                f"/prerender/{before[self.other.slug]['json']}"
+            ).status_code,
+            404,
+        )
+
+    def test_unpublished_removed(self):
+        prerender.build()
+        Document.objects.filter(pk=self.other.pk).update(is_published=False)
+        prerender.build()
+        self.assertEqual(set(self.manifest()), {self.published.slug})
+
+    def test_change_schedules_build(self):
+        with mock.patch.object(prerender, "schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                Document.objects.filter(pk=self.other.pk).touch()
+        schedule.assert_called()
+
+    def test_reorder_schedules_build(self):
+        self.client.force_authenticate(self.author)
+        items = [
+            {"id": self.published.pk, "order": 1},
+            {"id": self.other.pk, "order": 0},
+        ]
+        with mock.patch.object(prerender, "schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    "/api/docs/documents/reorder/", {"items": items}, format="json"
+                )
+        self.assertEqual(response.status_code, 200)
+        schedule.assert_called()
+
+    def test_like_state(self):
+        self.client.force_authenticate(self.author)
+        url = f"/api/docs/documents/{self.published.slug}/like/"
+        self.client.post(url)
+        self.assertEqual(
+            self.client.get(url).json(), {"is_liked": True, "likes_count": 1}
+        )
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class BenchmarkTest(TestCase):
+    def test_run_covers_every_endpoint(self):
+        results = benchmark.run(["3x4x2x3"], repeat=1)["3x4x2x3"]
+        self.assertEqual(results["documents.list"]["queries"], 1)
+        self.assertEqual(results["auth.me"]["queries"], 0)
+        self.assertGreater(results["documents.detail"]["bytes"], 0)
+        self.assertEqual(len(results), 25)
+        self.assertEqual(results["documents.destroy"]["bytes"], 0)
+        self.assertFalse(User.objects.exists())
+
+    def test_compare(self):
+        baseline = {"10x1x1x1": {"list": {"queries": 1, "p95_ms": 10.0}}}
+        ok = {"10x1x1x1": {"list": {"queries": 1, "p95_ms": 16.0}}}
+        self.assertEqual(benchmark.compare(ok, baseline), [])
+
+        slow = {"10x1x1x1": {"list": {"queries": 2, "p95_ms": 18.0}}}
+        failures = benchmark.compare(slow, baseline)
+        self.assertEqual(len(failures), 2)
+        self.assertIn("2 queries (baseline 1)", failures[0])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class QueryPlanTest(TestCase):
+    """No endpoint scans or sorts a whole content table."""
+
+    def explain(self, queryset):
+        return queryplan.explain(*queryset.query.sql_with_params())
+
+    def test_endpoints_use_indexes(self):
+        call_command(
+            "seed_docs", documents=5, blocks=4, likes=2, users=3, stdout=StringIO()
+        )
+        failures = queryplan.check_endpoints()
+        self.assertEqual(
+            failures,
+            {},
+            "\n".join(
+                f"{name}: {problems}\n  {sql}"
+                for name, found in failures.items()
+                for sql, problems in found
+            ),
+        )
+
+    def test_detects_scans_and_sorts(self):
+        self.assertEqual(
+            self.explain(Document.objects.filter(likes_count=1).order_by("title")),
+            ["SCAN docs_document", "USE TEMP B-TREE FOR ORDER BY"],
+        )
+        self.assertEqual(self.explain(Document.objects.filter(is_published=True)), [])
+        # Sorts of small tables are fine
+        self.assertEqual(self.explain(User.objects.order_by("role")), [])
+        # Aliased tables of subqueries count
+        liked = Like.objects.filter(created_at__isnull=True).values("document_id")
+        self.assertEqual(
+            self.explain(DocumentBlock.objects.filter(document__in=liked).order_by()),
+            ["SCAN U0"],
+        )
+
+    def test_postgres_plan(self):
+        plan = {
+            "Node Type": "Limit",
+            "Plans": [
+                {
+                    "Node Type": "Sort",
+                    "Sort Key": ["docs_document.title"],
+                    "Plans": [
+                        {"Node Type": "Seq Scan", "Relation Name": "docs_document"}
+                    ],
+                },
+                {"Node Type": "Seq Scan", "Relation Name": "accounts_customuser"},
+                {"Node Type": "Index Scan", "Relation Name": "docs_like"},
+            ],
+        }
+        self.assertEqual(
+            list(queryplan.plan_problems(plan, queryplan.LARGE_TABLES)),
+            ["Sort by docs_document.title", "Seq Scan on docs_document"],
+        )
+        self.assertEqual(
+            list(queryplan.plan_problems(plan, queryplan.LARGE_TABLES, sorts=False)),
+            ["Seq Scan on docs_document"],
+        )
+
+
+async def read_stream(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+class AsyncViewsTest(TestCase):
+    """
+    The async views of config.urls_async answer what the viewsets answer;
+    writes on their URLs still reach the viewsets.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username="admin", password="pass", role="admin"
+        )
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.document = Document.objects.create(
+            title="Guide", author=self.admin, is_published=True
+        )
+        for order in range(3):
+            DocumentBlock.objects.create(
+                document=self.document,
+                block_type="code",
+                content=f"x = {order}",
+                language="python",
+                order=order,
+            )
+        self.draft = Document.objects.create(
+            title="Draft", author=self.admin, is_published=False
+        )
+        Like.objects.create(user=self.reader, document=self.document)
+        self.login("reader")
+
+    def login(self, username):
+        self.client.post("/api/auth/login/", {"username": username, "password": "pass"})
+        self.async_client.cookies = self.client.cookies
+
+    def request(self, method, url, **kwargs):
+        with override_settings(ROOT_URLCONF="config.urls_async"):
+            return async_to_sync(getattr(self.async_client, method))(url, **kwargs)
+
+    def test_same_responses_as_viewsets(self):
+        slug, pk = self.document.slug, self.document.pk
+        for url in (
+            "/api/docs/documents/",
+            "/api/docs/documents/?page_size=1",
+            f"/api/docs/documents/{slug}/",
+            f"/api/docs/documents/{slug}/?stream=1",
+            f"/api/docs/documents/{pk}/blocks/",
+            f"/api/docs/documents/{pk}/blocks/?after_order=0&limit=1",
+        ):
+            with self.subTest(url=url):
+                expected = self.client.get(url)
+                response = self.request("get", url)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response["ETag"], expected["ETag"])
+                if expected.streaming:
+                    self.assertEqual(
+                        async_to_sync(read_stream)(response),
+                        b"".join(expected.streaming_content),
+                    )
+                else:
+                    self.assertEqual(response.json(), expected.json())
+
+    def test_detail(self):
+        url = f"/api/docs/documents/{self.document.slug}/"
+        response = self.request("get", url)
+        data = response.json()
+        self.assertEqual([block["order"] for block in data["blocks"]], [0, 1, 2])
+        self.assertTrue(data["is_liked"])
+        self.assertIn("<span", data["blocks"][0]["highlighted_html"])
+
+        response = self.request("get", url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_drafts_and_errors(self):
+        response = self.request("get", f"/api/docs/documents/{self.draft.slug}/")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json(), {"detail": "No Document matches the given query."}
+        )
+        response = self.request("get", f"/api/docs/documents/{self.draft.pk}/blocks/")
+        self.assertEqual(response.json(), [])
+        response = self.request("get", "/api/docs/documents/?cursor=bad")
+        self.assertEqual(response.status_code, 404)
+
+        self.async_client.cookies.clear()
+        response = self.request("get", "/api/docs/documents/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], 'Bearer realm="api"')
+
+    def test_writes_reach_the_viewsets(self):
+        self.login("admin")
+        response = self.request(
+            "post",
+            "/api/docs/documents/",
+            data={"title": "New", "is_published": True},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.request(
+            "patch",
+            "/api/docs/documents/reorder/",
+            data={"items": [{"id": self.document.pk, "order": 5}]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.order, 5)
+
+
+@override_settings(ALLOWED_HOSTS=["localhost", "127.0.0.1"])
+class LoadGeneratorTest(LiveServerTestCase):
+    def test_run(self):
+        call_command(
+            "seed_docs", documents=2, blocks=2, likes=1, users=2, stdout=StringIO()
+        )
+        document = Document.objects.filter(is_published=True).first()
+        host, port = self.server_thread.host, self.server_thread.port
+        cookie = async_to_sync(loadgen.login)(
+            host, port, "seed-user-0", "seed-password"
+        )
+        paths = ["/api/docs/documents/", f"/api/docs/documents/{document.slug}/"]
+        result = async_to_sync(loadgen.run)(host, port, paths, cookie, 3, 0.5, slow=1)
+        self.assertGreater(result["requests"], 0)
+        self.assertEqual(result["errors"], 0)
+        self.assertIsNotNone(result["p95_ms"])
@@ -3,13 +3,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import DocumentViewSet, DocumentBlockViewSet
+from .views import DocumentViewSet, DocumentBlockViewSet, search_view
 
 router = DefaultRouter()
 router.register(r"documents", DocumentViewSet, basename="document")
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("search/", search_view, name="search"),
     path(
         "documents/<int:document_pk>/blocks/",
         DocumentBlockViewSet.as_view({"get": "list", "post": "create"}),
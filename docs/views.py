@@ -1,23 +1,187 @@
 # docs/views.py
 
+import json
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from config.replicas import replica_reads
 
-from .models import Document, DocumentBlock, Like
+from . import fieldsets, highlight, search
+from .cache import document_payload_key, document_version, get_or_build
+from .conditional import add_validators, make_etag, not_modified
+from .models import Document, DocumentBlock, Like, content_changed
 from .serializers import (
     DocumentSerializer,
+    DocumentHeaderSerializer,
     DocumentListSerializer,
     DocumentBlockSerializer,
+    SearchResultSerializer,
 )
+from .pagination import KeysetPagination
 from .permissions import IsAdminOrReadOnly, IsAdminUser
 
 
+BLOCK_FIELDS = ["block_type", "content", "language", "order"]
+HIGHLIGHT_FIELDS = ["highlighted_html", "highlight_hash"]
+BULK_BATCH_SIZE = 500
+STREAM_CHUNK_SIZE = 200
+MAX_BLOCK_WINDOW = 500
+# Per reader and per like; never part of the shared document payload
+PER_REQUEST_FIELDS = ("likes_count", "is_liked")
+
+
+def visible_documents(user):
+    if user.role == "admin":
+        return Document.objects.all()
+    return Document.objects.filter(is_published=True)
+
+
+def visible_blocks(user, document_id):
+    queryset = DocumentBlock.objects.filter(document_id=document_id)
+    if user.role != "admin":
+        queryset = queryset.filter(document__is_published=True)
+    return queryset
+
+
+def with_is_liked(queryset, user_id):
+    # is_liked comes with the document row, so DocumentSerializer doesn't
+    # need its per-object fallback query.
+    return queryset.annotate(
+        is_liked=Exists(Like.objects.filter(user_id=user_id, document=OuterRef("pk")))
+    )
+
+
+def list_queryset(user, fields):
+    """One query per page, loading only the columns `fields` come from."""
+    queryset = fieldsets.narrow(visible_documents(user), DocumentListSerializer, fields)
+    if "blocks" in fields:
+        queryset = queryset.prefetch_related("blocks")
+    return queryset
+
+
+def detail_queryset(user, fields):
+    queryset = fieldsets.narrow(visible_documents(user), DocumentSerializer, fields)
+    if "is_liked" in fields:
+        queryset = with_is_liked(queryset, user.id)
+    return queryset
+
+
+def window_blocks(queryset, params):
+    """
+    ?after_order=<order>&after_id=<id>&limit=<n>
+
+    Blocks after the given position in (order, id) order, so a client can
+    fetch a long document piece by piece. after_id breaks ties between
+    blocks that share an order.
+    """
+    if not {"after_order", "limit"} & params.keys():
+        return queryset
+    try:
+        limit = min(
+            max(int(params.get("limit", MAX_BLOCK_WINDOW)), 1), MAX_BLOCK_WINDOW
+        )
+        if "after_order" in params:
+            after_order = int(params["after_order"])
+            after_id = int(params.get("after_id", 0))
+            queryset = queryset.filter(
+                Q(order__gt=after_order) | Q(order=after_order, id__gt=after_id)
+            )
+    except ValueError:
+        raise ValidationError(
+            {"detail": "after_order, after_id and limit must be integers."}
+        )
+    return queryset.order_by("order", "id")[:limit]
+
+
+def page_etag(request, page, fields):
+    """
+    ETag of a document list page, from the rows already fetched, so a 304
+    costs the one list query and no serialization. There is no
+    Last-Modified: a deleted or unpublished document changes the page
+    without changing any updated_at on it.
+    """
+    return make_etag(
+        request.get_full_path(),
+        [
+            (doc.pk, doc.updated_at, "likes_count" in fields and doc.likes_count)
+            for doc in page
+        ],
+    )
+
+
+def document_etag(document, stream, fields):
+    return make_etag(
+        document_version(document),
+        *(getattr(document, name) for name in PER_REQUEST_FIELDS if name in fields),
+        stream,
+        fields,
+    )
+
+
+def document_last_modified(document, fields):
+    """
+    updated_at, if it versions everything `fields` show. Likes change the
+    like fields without it, so with those only the ETag can validate.
+    """
+    if any(name in fields for name in PER_REQUEST_FIELDS):
+        return None
+    return document.updated_at
+
+
+def per_request_data(document, fields):
+    return {
+        name: getattr(document, name) for name in PER_REQUEST_FIELDS if name in fields
+    }
+
+
+def ndjson(data):
+    return json.dumps(data, cls=DjangoJSONEncoder) + "\n"
+
+
+def apply_order(queryset, items, **extra):
+    """
+    Write [{"id": ..., "order": ...}, ...] to `queryset` with one
+    UPDATE ... SET order = CASE id WHEN ... END. Ids outside the queryset
+    are rejected before anything is written.
+    """
+    try:
+        orders = {int(item["id"]): int(item["order"]) for item in items}
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError({"items": "Expected a list of {id, order} objects."})
+    if not orders:
+        return
+
+    found = set(
+        queryset.select_for_update().filter(id__in=orders).values_list("id", flat=True)
+    )
+    unknown = sorted(orders.keys() - found)
+    if unknown:
+        raise ValidationError({"items": f"Unknown ids: {unknown}"})
+
+    queryset.filter(id__in=orders).update(
+        order=Case(
+            *(When(id=pk, then=Value(order)) for pk, order in orders.items()),
+            output_field=IntegerField(),
+        ),
+        **extra,
+    )
+
+
+@replica_reads
 class DocumentViewSet(viewsets.ModelViewSet):
     queryset = Document.objects.filter(is_published=True)
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
     lookup_field = "slug"
 
     def get_serializer_class(self):
@@ -25,43 +189,181 @@ class DocumentViewSet(viewsets.ModelViewSet):
             return DocumentListSerializer
         return DocumentSerializer
 
+    def get_fields(self):
+        """The fields ?fields=, ?include= and ?exclude= ask for."""
+        if not hasattr(self, "_fields"):
+            self._fields = fieldsets.requested_fields(
+                self.request.query_params, self.get_serializer_class()
+            )
+        return self._fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ("list", "retrieve"):
+            kwargs.setdefault("fields", self.get_fields())
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        if self.request.user.role == "admin":
-            return Document.objects.all()
-        return Document.objects.filter(is_published=True)
+        if self.action == "list":
+            return list_queryset(self.request.user, self.get_fields())
+        if self.action == "retrieve":
+            return detail_queryset(self.request.user, self.get_fields())
+        queryset = visible_documents(self.request.user)
+        if self.action in ("update", "partial_update"):
+            queryset = with_is_liked(
+                queryset.select_related("author"), self.request.user.id
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        etag = page_etag(request, page, self.get_fields())
+        response = not_modified(request, etag)
+        if response is None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        return add_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        document = self.get_object()
+        fields = self.get_fields()
+        stream = request.query_params.get("stream") == "1"
+        etag = document_etag(document, stream, fields)
+        last_modified = document_last_modified(document, fields)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        if stream:
+            response = StreamingHttpResponse(
+                self.stream_document(document), content_type="application/x-ndjson"
+            )
+            return add_validators(response, etag, last_modified)
+
+        def build():
+            data = dict(self.get_serializer(document).data)
+            for name in PER_REQUEST_FIELDS:
+                data.pop(name, None)
+            return data
+
+        # Document fields and blocks are shared by every reader; the like
+        # counters come with the document row and are added per request.
+        data = get_or_build(
+            document_payload_key(document, fields), build, name="document"
+        )
+        response = Response({**data, **per_request_data(document, fields)})
+        return add_validators(response, etag, last_modified)
+
+    def stream_document(self, document):
+        """
+        GET /api/docs/documents/<slug>/?stream=1
+
+        One JSON object per line: {"type": "document", ...} without blocks,
+        then {"type": "block", ...} per block in order. Blocks are read in
+        chunks, so memory stays flat however long the document is.
+        """
+        fields = self.get_fields()
+        header = DocumentHeaderSerializer(
+            document, context=self.get_serializer_context(), fields=fields
+        )
+        yield ndjson({"type": "document", **header.data})
+        if "blocks" not in fields:
+            return
+
+        blocks = document.blocks.order_by("order", "id")
+        for block in blocks.iterator(chunk_size=STREAM_CHUNK_SIZE):
+            data = DocumentBlockSerializer(block).data
+            yield ndjson({"type": "block", **data})
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        document = serializer.save(author_id=self.request.user.id)
+        document.is_liked = False
 
-    @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=["get", "post"], permission_classes=[IsAuthenticated])
     def like(self, request, slug=None):
+        """
+        GET returns the like state alone, for clients that read the document
+        itself from its prerendered snapshot. POST toggles it.
+        """
         document = self.get_object()
-        like, created = Like.objects.get_or_create(user=request.user, document=document)
+        if request.method == "GET":
+            liked = Like.objects.filter(
+                user_id=request.user.id, document=document
+            ).exists()
+            return Response({"is_liked": liked, "likes_count": document.likes_count})
 
-        if not created:
-            like.delete()
-            return Response({"status": "unliked"}, status=status.HTTP_200_OK)
+        documents = Document.objects.filter(pk=document.pk)
 
-        return Response({"status": "liked"}, status=status.HTTP_201_CREATED)
+        # The Like row and the counter change in the same transaction; F()
+        # keeps concurrent toggles from overwriting each other's counts.
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(
+                user_id=request.user.id, document=document
+            ).delete()
+            if deleted:
+                documents.update(likes_count=F("likes_count") - 1)
+            else:
+                _, created = Like.objects.get_or_create(
+                    user_id=request.user.id, document=document
+                )
+                if created:
+                    documents.update(likes_count=F("likes_count") + 1)
+            likes_count = documents.values_list("likes_count", flat=True).get()
+
+        liked = not deleted
+        return Response(
+            {
+                "status": "liked" if liked else "unliked",
+                "is_liked": liked,
+                "likes_count": likes_count,
+            },
+            status=status.HTTP_201_CREATED if liked else status.HTTP_200_OK,
+        )
 
     @action(detail=False, methods=["patch"], permission_classes=[IsAdminUser])
     def reorder(self, request):
         """
         [{"id": 1, "order": 0}, {"id": 2, "order": 1}, ...]
         """
-        items = request.data.get("items", [])
-        for item in items:
-            Document.objects.filter(id=item["id"]).update(order=item["order"])
+        with transaction.atomic():
+            apply_order(
+                Document.objects.all(),
+                request.data.get("items", []),
+                updated_at=timezone.now(),
+            )
+            # Bumped in the same UPDATE rather than by touch(), so announce it
+            content_changed.send(sender=Document)
         return Response({"status": "reordered"}, status=status.HTTP_200_OK)
 
 
+@replica_reads
 class DocumentBlockViewSet(viewsets.ModelViewSet):
     serializer_class = DocumentBlockSerializer
-    permission_classes = [IsAdminUser]
+    # Readers may fetch the blocks of published documents; every write
+    # needs an admin.
+    permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
+        queryset = visible_blocks(self.request.user, self.kwargs.get("document_pk"))
+        if self.action == "list":
+            queryset = window_blocks(queryset, self.request.query_params)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
         document_id = self.kwargs.get("document_pk")
-        return DocumentBlock.objects.filter(document_id=document_id)
+        updated_at = (
+            visible_documents(request.user)
+            .filter(pk=document_id)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        if updated_at is None:
+            return super().list(request, *args, **kwargs)
+
+        # Block changes touch the document, so its updated_at versions them.
+        etag = make_etag(document_id, updated_at, request.get_full_path())
+        response = not_modified(request, etag, updated_at)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return add_validators(response, etag, updated_at)
 
     def perform_create(self, serializer):
         document_id = self.kwargs.get("document_pk")
@@ -73,29 +375,105 @@ class DocumentBlockViewSet(viewsets.ModelViewSet):
         """
         [{"id": 1, "order": 0}, {"id": 2, "order": 1}, ...]
         """
-        items = request.data.get("items", [])
-        for item in items:
-            DocumentBlock.objects.filter(id=item["id"]).update(order=item["order"])
+        with transaction.atomic():
+            apply_order(
+                DocumentBlock.objects.filter(document_id=document_pk),
+                request.data.get("items", []),
+            )
+            Document.objects.filter(pk=document_pk).touch()
         return Response({"status": "reordered"}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["post"], url_path="bulk")
     def bulk_update(self, request, document_pk=None):
+        """
+        {"blocks": [{"id": 1, "block_type": "text", "content": "...", ...}, ...]}
+
+        Blocks are matched to the document's existing blocks by id: unchanged
+        rows are left alone, changed rows are updated, blocks without a known
+        id are inserted and blocks that aren't sent are deleted.
+        """
         document = get_object_or_404(Document, pk=document_pk)
         blocks_data = request.data.get("blocks", [])
 
-        DocumentBlock.objects.filter(document=document).delete()
+        serializer = DocumentBlockSerializer(data=blocks_data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            existing = {
+                block.id: block
+                for block in DocumentBlock.objects.select_for_update().filter(
+                    document=document
+                )
+            }
+            blocks, to_create, to_update = [], [], []
+            for raw, values in zip(blocks_data, serializer.validated_data):
+                block = existing.pop(raw.get("id"), None)
+                if block is None:
+                    block = DocumentBlock(document=document, **values)
+                    to_create.append(block)
+                elif any(getattr(block, f) != v for f, v in values.items()):
+                    for field, value in values.items():
+                        setattr(block, field, value)
+                    to_update.append(block)
+                blocks.append(block)
+
+            # bulk_* skip save(), so render the code blocks here
+            for block in to_create + to_update:
+                highlight.apply(block)
+
+            # Whatever is left in `existing` wasn't sent back
+            if existing:
+                DocumentBlock.objects.filter(id__in=existing).delete()
+            if to_update:
+                DocumentBlock.objects.bulk_update(
+                    to_update,
+                    BLOCK_FIELDS + HIGHLIGHT_FIELDS,
+                    batch_size=BULK_BATCH_SIZE,
+                )
+            if to_create:
+                DocumentBlock.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+
+            if existing or to_update or to_create:
+                Document.objects.filter(pk=document.pk).touch()
+                search.index_documents([document.pk])
+
+        return Response(
+            {
+                "status": "updated",
+                "ids": [block.id for block in blocks],
+                "created": len(to_create),
+                "updated": len(to_update),
+                "deleted": len(existing),
+            },
+            status=status.HTTP_200_OK,
+        )
 
-        blocks_to_create = [
-            DocumentBlock(
-                document=document,
-                block_type=block["block_type"],
-                content=block["content"],
-                language=block.get("language", ""),
-                order=block["order"],
-            )
-            for block in blocks_data
-        ]
 
-        DocumentBlock.objects.bulk_create(blocks_to_create)
+@api_view(["GET"])
+def search_view(request):
+    """
+    GET /api/docs/search/?q=...&limit=20
+    """
+    query = request.query_params.get("q", "")
+    try:
+        limit = min(max(int(request.query_params.get("limit", 20)), 1), 50)
+    except ValueError:
+        limit = 20
 
-        return Response({"status": "updated"}, status=status.HTTP_200_OK)
+    hits = search.search(
+        query, published_only=request.user.role != "admin", limit=limit
+    )
+    # Results come back in rank order; the model's ordering would only add
+    # a sort
+    documents = (
+        Document.objects.select_related("author")
+        .order_by()
+        .in_bulk([hit.document_id for hit in hits])
+    )
+    results = [
+        (hit, documents[hit.document_id])
+        for hit in hits
+        if hit.document_id in documents
+    ]
+    serializer = SearchResultSerializer(results, many=True)
+    return Response({"query": query, "results": serializer.data})
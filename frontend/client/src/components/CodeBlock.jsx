@@ -1,10 +1,14 @@
 // frontend/client/src/components/CodeBlock.jsx
 
-import { useState } from 'react';
-import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
+import { lazy, Suspense, useState } from 'react';
 // import { vscDarkPlus } from 'react-syntax-highlighter/dist/esm/styles/prism';
 
-export default function CodeBlock({ code, language }) {
+// Only loaded for blocks the server hasn't highlighted yet
+const SyntaxHighlighter = lazy(() =>
+  import('react-syntax-highlighter').then((module) => ({ default: module.Prism }))
+);
+
+export default function CodeBlock({ code, language, html }) {
   const [copied, setCopied] = useState(false);
 
   const handleCopy = async () => {
@@ -76,19 +80,28 @@ export default function CodeBlock({ code, language }) {
         </button>
       </div>
       <div className="code-content">
-        <SyntaxHighlighter
-          language={language}
-          style={customTheme}
-          customStyle={{
-            margin: 0,
-            padding: 0,
-            background: 'transparent',
-            fontFamily: 'JetBrains Mono, monospace',
-            fontWeight: 500,
-          }}
-        >
-          {code}
-        </SyntaxHighlighter>
+        {html ? (
+          // Pygments output from the API; the code itself is escaped
+          <pre className="highlight">
+            <code dangerouslySetInnerHTML={{ __html: html }} />
+          </pre>
+        ) : (
+          <Suspense fallback={<pre><code>{code}</code></pre>}>
+            <SyntaxHighlighter
+              language={language}
+              style={customTheme}
+              customStyle={{
+                margin: 0,
+                padding: 0,
+                background: 'transparent',
+                fontFamily: 'JetBrains Mono, monospace',
+                fontWeight: 500,
+              }}
+            >
+              {code}
+            </SyntaxHighlighter>
+          </Suspense>
+        )}
       </div>
     </div>
   );
@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react';
 import { Link, useParams } from 'react-router-dom';
-import { apiRequest } from '../utils/api';
+import { fetchAllPages } from '../utils/api';
 
 export default function Sidebar({ isOpen, onClose }) {
   const [documents, setDocuments] = useState([]);
@@ -18,13 +18,10 @@ export default function Sidebar({ isOpen, onClose }) {
 
   const fetchDocuments = async () => {
     try {
-      const response = await apiRequest('/api/docs/documents/', {
-        method: 'GET',
-      });
-      
-      if (response && response.ok) {
-        const data = await response.json();
-        setDocuments(data);
+      const results = await fetchAllPages('/api/docs/documents/?page_size=100&fields=id,title,slug,likes_count');
+
+      if (results) {
+        setDocuments(results);
       }
     } catch (error) {
       console.error('Failed to fetch documents:', error);
@@ -1,7 +1,7 @@
 // src/context/AuthContext.jsx
 
 import { createContext, useContext, useState, useEffect } from 'react';
-import { apiRequest } from '../utils/api';
+import { apiRequest, clearValidatorCache } from '../utils/api';
 
 const AuthContext = createContext();
 
@@ -84,6 +84,7 @@ export function AuthProvider({ children }) {
       await apiRequest('/api/auth/logout/', {
         method: 'POST',
       });
+      clearValidatorCache();
       setUser(null);
     } catch (error) {
       console.error('Logout failed:', error);
@@ -3,7 +3,7 @@
 import { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
-import { apiRequest } from '../utils/api';
+import { apiRequest, fetchPrerendered } from '../utils/api';
 import CodeBlock from '../components/CodeBlock';
 import DOMPurify from 'dompurify';
 
@@ -21,6 +21,13 @@ export default function DocumentDetail() {
 
   const fetchDocument = async () => {
     try {
+      // Admins read the live document; snapshots trail edits by a moment
+      const prerendered = isAdmin ? null : await fetchPrerendered(slug);
+      if (prerendered) {
+        setDocument(prerendered);
+        return;
+      }
+
       const response = await apiRequest(`/api/docs/documents/${slug}/`, {
         method: 'GET',
       });
@@ -49,7 +56,8 @@ export default function DocumentDetail() {
       });
 
       if (response && response.ok) {
-        await fetchDocument();
+        const { is_liked, likes_count } = await response.json();
+        setDocument((prev) => ({ ...prev, is_liked, likes_count }));
         window.dispatchEvent(new Event('documentsUpdated'));
       }
     } catch (error) {
@@ -136,6 +144,7 @@ export default function DocumentDetail() {
                 <CodeBlock
                   code={block.content}
                   language={block.language || 'plaintext'}
+                  html={block.highlighted_html}
                 />
               )}
             </div>
@@ -6,21 +6,24 @@ import { apiRequest } from '../../utils/api';
 
 export default function AdminDashboard() {
   const [documents, setDocuments] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchDocuments();
   }, []);
 
-  const fetchDocuments = async () => {
+  const fetchDocuments = async (url = '/api/docs/documents/', append = false) => {
     try {
-      const response = await apiRequest('/api/docs/documents/', {
+      const response = await apiRequest(url, {
         method: 'GET',
       });
       
       if (response && response.ok) {
         const data = await response.json();
-        setDocuments(data);
+        setDocuments(prev => (append ? [...prev, ...data.results] : data.results));
+        setNextUrl(data.next);
       }
     } catch (error) {
       console.error('Failed to fetch documents:', error);
@@ -29,6 +32,14 @@ export default function AdminDashboard() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextUrl || loadingMore) return;
+
+    setLoadingMore(true);
+    await fetchDocuments(nextUrl, true);
+    setLoadingMore(false);
+  };
+
   const handleDelete = async (slug, title) => {
     if (!confirm(`Are you sure you want to delete "${title}"?`)) {
       return;
@@ -135,6 +146,14 @@ export default function AdminDashboard() {
             ))}
           </div>
         )}
+
+        {nextUrl && (
+          <div className="text-center mt-lg">
+            <button onClick={loadMore} className="btn btn-secondary" disabled={loadingMore}>
+              {loadingMore ? <span className="loading"></span> : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -64,7 +64,10 @@ export default function AdminDocumentEdit() {
       const docData = await docResponse.json();
       const docId = docData.id;
 
+      // Existing blocks keep their server ids so only the diff is written;
+      // new blocks carry a local Date.now() id the server treats as new.
       const blocksPayload = blocks.map((block, index) => ({
+        id: block.id,
         block_type: block.block_type,
         content: block.content,
         language: block.language || '',
@@ -10,6 +10,46 @@ function getCsrfToken() {
 let isRefreshing = false;
 let failedQueue = [];
 
+// GET responses keyed by URL, replayed when the server answers 304
+const validatorCache = new Map();
+
+function addValidators(url, headers) {
+  const cached = validatorCache.get(url);
+  if (cached) {
+    headers['If-None-Match'] = cached.etag;
+    if (cached.lastModified) {
+      headers['If-Modified-Since'] = cached.lastModified;
+    }
+  }
+}
+
+export function clearValidatorCache() {
+  validatorCache.clear();
+}
+
+async function revalidate(url, response) {
+  if (response.status === 304) {
+    const cached = validatorCache.get(url);
+    if (cached) {
+      return new Response(cached.body, {
+        status: 200,
+        headers: { 'Content-Type': 'application/json', ETag: cached.etag },
+      });
+    }
+    return response;
+  }
+
+  const etag = response.headers.get('ETag');
+  if (response.ok && etag) {
+    validatorCache.set(url, {
+      etag,
+      lastModified: response.headers.get('Last-Modified'),
+      body: await response.clone().text(),
+    });
+  }
+  return response;
+}
+
 const processQueue = (error) => {
   failedQueue.forEach(prom => {
     if (error) {
@@ -28,6 +68,11 @@ export async function apiRequest(url, options = {}) {
     ...options.headers,
   };
   
+  const isGet = !options.method || options.method.toUpperCase() === 'GET';
+  if (isGet) {
+    addValidators(url, headers);
+  }
+  
   if (['POST', 'PUT', 'PATCH', 'DELETE'].includes(options.method?.toUpperCase())) {
     const csrfToken = getCsrfToken();
     if (csrfToken) {
@@ -50,7 +95,7 @@ export async function apiRequest(url, options = {}) {
           failedQueue.push({ resolve, reject });
         }).then(() => {
           return fetch(url, config);
-        });
+        }).then((retried) => (isGet ? revalidate(url, retried) : retried));
       }
       
       isRefreshing = true;
@@ -80,8 +125,60 @@ export async function apiRequest(url, options = {}) {
       }
     }
     
-    return response;
+    return isGet ? revalidate(url, response) : response;
   } catch (error) {
     throw error;
   }
-}
\ No newline at end of file
+}
+
+export async function fetchAllPages(url, options = {}) {
+  const results = [];
+  let nextUrl = url;
+
+  while (nextUrl) {
+    const response = await apiRequest(nextUrl, { method: 'GET', ...options });
+    if (!response || !response.ok) {
+      return null;
+    }
+    const data = await response.json();
+    results.push(...data.results);
+    nextUrl = data.next;
+  }
+
+  return results;
+}
+
+// Set by the server in index.html when PRERENDER_ENABLED is on
+const prerenderEnabled = Boolean(document.querySelector('meta[name="prerender"]'));
+
+// Snapshot of a published document written by `manage.py prerender`, with
+// the reader's like state from the API. Resolves to null when there is no
+// snapshot, so callers fall back to the document endpoint.
+export async function fetchPrerendered(slug) {
+  if (!prerenderEnabled) {
+    return null;
+  }
+  try {
+    const manifestResponse = await apiRequest('/prerender/manifest.json', { method: 'GET' });
+    if (!manifestResponse || !manifestResponse.ok) {
+      return null;
+    }
+    const { documents } = await manifestResponse.json();
+    const entry = documents[slug];
+    if (!entry) {
+      return null;
+    }
+
+    const [snapshot, likes] = await Promise.all([
+      fetch(`/prerender/${entry.json}`),
+      apiRequest(`/api/docs/documents/${slug}/like/`, { method: 'GET' }),
+    ]);
+    if (!snapshot.ok || !likes || !likes.ok) {
+      return null;
+    }
+    return { ...(await snapshot.json()), ...(await likes.json()) };
+  } catch (error) {
+    console.error('Failed to load snapshot:', error);
+    return null;
+  }
+}
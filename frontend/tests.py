@@ -0,0 +1,79 @@
+# frontend/tests.py
+
+import gzip
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from .views import brotli, get_shell
+
+
+class IndexShellTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, "static/frontend"))
+        self.path = os.path.join(self.tmp.name, "static/frontend/index.html")
+        self.write("<html>v1</html>")
+        settings = override_settings(BASE_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, html, mtime=1_000_000):
+        with open(self.path, "w") as f:
+            f.write(html)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_serves_shell_for_deep_links(self):
+        response = self.client.get("/docs/some-document/")
+        self.assertEqual(response.content, b"<html>v1</html>")
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertTrue(response.headers["ETag"])
+
+    def test_gzip_variant(self):
+        response = self.client.get("/", headers={"accept-encoding": "gzip, deflate"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), b"<html>v1</html>")
+
+    def test_refused_encodings(self):
+        for accept_encoding in ("gzip;q=0", "gzip; q=0.0, identity", "*;q=0", ""):
+            response = self.client.get(
+                "/", headers={"accept-encoding": accept_encoding}
+            )
+            self.assertNotIn("Content-Encoding", response.headers, accept_encoding)
+            self.assertEqual(response.content, b"<html>v1</html>")
+
+    def test_encoding_preference(self):
+        shell = get_shell()
+        self.assertEqual(shell.negotiate("gzip;q=0.5, *;q=0.1"), "gzip")
+        self.assertEqual(shell.negotiate("*"), "br" if brotli else "gzip")
+        self.assertEqual(shell.negotiate("br;q=0, *"), "gzip")
+        self.assertEqual(shell.negotiate("GZIP;Q=1"), "gzip")
+        self.assertIsNone(shell.negotiate("gzip;q=x"))
+
+    def test_not_modified(self):
+        etag = self.client.get("/").headers["ETag"]
+        response = self.client.get("/login", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_reloads_when_file_changes(self):
+        etag = self.client.get("/").headers["ETag"]
+        self.write("<html>v2</html>", mtime=2_000_000)
+        response = self.client.get("/", headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"<html>v2</html>")
+
+    def test_prerender_flag(self):
+        self.write("<html><head></head>v1</html>")
+        self.assertNotIn(b"prerender", self.client.get("/").content)
+        with override_settings(PRERENDER_ENABLED=True):
+            response = self.client.get("/")
+        self.assertEqual(
+            response.content,
+            b'<html><head><meta name="prerender" content="on"></head>v1</html>',
+        )
@@ -1,11 +1,104 @@
 # frontend.views.py
 
-from django.http import HttpResponse
-from django.conf import settings
+import gzip
+import hashlib
 import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Ours, best first; ties in the client's q-values go to the earlier one
+ENCODINGS = ("br", "gzip")
+# Tells the client there is a manifest to look for; without it the client
+# goes straight to the API instead of fetching a manifest that 404s
+PRERENDER_META = b'<meta name="prerender" content="on">'
+
+
+class Shell:
+    """
+    index.html held in memory with its compressed variants, built once per
+    mtime of the file on disk and PRERENDER_ENABLED setting.
+    """
+
+    def __init__(self, path, key):
+        with open(path, "rb") as f:
+            content = f.read()
+        if settings.PRERENDER_ENABLED:
+            content = content.replace(b"</head>", PRERENDER_META + b"</head>", 1)
+        self.key = key
+        self.etag = f'W/"{hashlib.sha1(content).hexdigest()}"'
+        self.variants = {None: content, "gzip": gzip.compress(content, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(content)
+
+    def negotiate(self, accept_encoding):
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0
+        for encoding in ENCODINGS:
+            q = accepted.get(encoding, accepted.get("*", 0))
+            if encoding in self.variants and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+
+def parse_accept_encoding(header):
+    """
+    {coding: q} for an Accept-Encoding header. A malformed q counts as 0,
+    so a coding is only used when the client plainly accepts it.
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+_shell = None
+_lock = threading.Lock()
+
+
+def get_shell():
+    global _shell
+    path = os.path.join(settings.BASE_DIR, "static/frontend/index.html")
+    # A stat per request instead of a read; rebuilds pick up new deploys
+    key = (os.stat(path).st_mtime_ns, settings.PRERENDER_ENABLED)
+    shell = _shell
+    if shell is None or shell.key != key:
+        with _lock:
+            if _shell is None or _shell.key != key:
+                _shell = Shell(path, key)
+            shell = _shell
+    return shell
 
 
 def index(request):
-    html_path = os.path.join(settings.BASE_DIR, "static/frontend/index.html")
-    with open(html_path, "r") as f:
-        return HttpResponse(f.read())
+    shell = get_shell()
+    response = get_conditional_response(request, etag=shell.etag)
+    if response is None:
+        encoding = shell.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        response = HttpResponse(shell.variants[encoding])
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.headers["ETag"] = shell.etag
+    # The shell points at hashed assets, so it must be revalidated on every
+    # navigation; revalidation is a 304 without a body.
+    response.headers["Cache-Control"] = "no-cache"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response